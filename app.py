@@ -6,7 +6,20 @@ import datetime
 import requests
 import io
 import hashlib
-from typing import List, Dict, Tuple, Optional
+import mmap
+import pickle
+import sqlite3
+import sys
+import sysconfig
+import tempfile
+import threading
+import tracemalloc
+import unicodedata
+import uuid
+import time
+from collections import OrderedDict, deque
+import numpy as np
+from typing import List, Dict, Tuple, Optional, Any, Callable, Protocol
 from dataclasses import dataclass
 
 # Import Groq with fallback handling
@@ -38,6 +51,12 @@ except ImportError:
         fitz = None
         print("⚠️ No PDF library available. PDF search disabled.")
 
+# File locking for the shared document store (POSIX only)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 # Check for RAG libraries (optional - graceful degradation)
 try:
     from sentence_transformers import SentenceTransformer
@@ -56,16 +75,1233 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-@dataclass
+def normalize_question(text: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    text = unicodedata.normalize('NFD', text.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).replace('ς', 'σ')
+    return ' '.join(re.findall(r'\w+', text))
+
+# Greeklish -> Greek, longest Latin sequences first
+GREEKLISH_DIGRAPHS = (('th', 'θ'), ('ch', 'χ'), ('kh', 'χ'), ('ps', 'ψ'), ('ks', 'ξ'), ('ou', 'ου'))
+GREEKLISH_LETTERS = str.maketrans({
+    'a': 'α', 'b': 'β', 'c': 'κ', 'd': 'δ', 'e': 'ε', 'f': 'φ', 'g': 'γ', 'h': 'η', 'i': 'ι',
+    'j': 'ξ', 'k': 'κ', 'l': 'λ', 'm': 'μ', 'n': 'ν', 'o': 'ο', 'p': 'π', 'r': 'ρ', 's': 'σ',
+    't': 'τ', 'u': 'υ', 'v': 'β', 'w': 'ω', 'x': 'χ', 'y': 'υ', 'z': 'ζ', '8': 'θ', '3': 'ξ', '9': 'θ',
+})
+
+def greeklish_to_greek(word: str) -> str:
+    """Transliterate a lowercase Greeklish word (accents are lost, so pair with phonetic_key)"""
+    for latin, greek in GREEKLISH_DIGRAPHS:
+        word = word.replace(latin, greek)
+    return word.translate(GREEKLISH_LETTERS)
+
+# Letters and digraphs that sound alike (and are confused in typos and Greeklish)
+PHONETIC_DIGRAPHS = (('ει', 'ι'), ('οι', 'ι'), ('υι', 'ι'), ('αι', 'ε'))
+PHONETIC_LETTERS = str.maketrans({'η': 'ι', 'υ': 'ι', 'ω': 'ο'})
+
+def phonetic_key(word: str) -> str:
+    """Accent-free key where same-sounding spellings and doubled letters coincide"""
+    key = normalize_question(word).replace(' ', '')
+    for digraph, sound in PHONETIC_DIGRAPHS:
+        key = key.replace(digraph, sound)
+    key = key.translate(PHONETIC_LETTERS)
+    return re.sub(r'(.)\1+', r'\1', key)
+
+class TrigramIndex:
+    """Character-trigram index over vocabulary words for fuzzy (typo/Greeklish) lookup.
+
+    Words are indexed by the trigrams of their phonetic key; a query word
+    is resolved to the vocabulary word with the highest Dice coefficient
+    over shared trigrams.
+    """
+
+    MIN_LENGTH = 4          # shorter words are only matched exactly
+    MIN_SIMILARITY = 0.6
+
+    def __init__(self, words):
+        self.words: List[List[str]] = []     # surface forms sharing one key
+        self.keys: Dict[str, int] = {}
+        self.sizes: List[int] = []
+        self.postings: Dict[str, List[int]] = {}
+        for word in words:
+            key = phonetic_key(word)
+            if not key:
+                continue
+            if key in self.keys:
+                forms = self.words[self.keys[key]]
+                if word not in forms:
+                    forms.append(word)
+                continue
+            word_id = len(self.words)
+            self.keys[key] = word_id
+            self.words.append([word])
+            grams = self.trigrams(key)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(word_id)
+
+    @staticmethod
+    def trigrams(key: str) -> set:
+        padded = f" {key} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def lookup(self, word: str) -> Tuple[Optional[List[str]], float]:
+        """Spellings of the closest vocabulary word and its similarity (None if below MIN_SIMILARITY)"""
+        key = phonetic_key(word)
+        exact = self.keys.get(key)
+        if exact is not None:
+            return self.words[exact], 1.0
+        if len(key) < self.MIN_LENGTH:
+            return None, 0.0
+        grams = self.trigrams(key)
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for word_id in self.postings.get(gram, ()):
+                shared[word_id] = shared.get(word_id, 0) + 1
+        best, best_similarity = None, 0.0
+        for word_id, count in shared.items():
+            similarity = 2 * count / (len(grams) + self.sizes[word_id])
+            if similarity > best_similarity:
+                best, best_similarity = word_id, similarity
+        if best is None or best_similarity < self.MIN_SIMILARITY:
+            return None, best_similarity
+        return self.words[best], best_similarity
+
+@dataclass(frozen=True)
 class QAEntry:
+    """Immutable Q&A entry with pre-normalized fields for scoring.
+
+    Lowered strings are interned so equal keywords, words and categories
+    are shared across entries instead of being copied per entry.
+    """
+    __slots__ = ('id', 'category', 'question', 'answer', 'keywords', 'aliases',
+                 'category_lower', 'question_lower', 'keywords_lower',
+                 'title_words', 'title_terms')
+
     id: int
     category: str
     question: str
     answer: str
-    keywords: List[str]
+    keywords: Tuple[str, ...]
+    aliases: Tuple[str, ...]              # alternative phrasings for exact lookup
+    category_lower: str
+    question_lower: str
+    keywords_lower: Tuple[str, ...]
+    title_words: Tuple[str, ...]          # all words of the lowered question
+    title_terms: Tuple[str, ...]          # words longer than 2 characters
+
+    @classmethod
+    def from_dict(cls, entry: Dict) -> 'QAEntry':
+        """Build an entry from a raw qa_data.json record"""
+        question_lower = entry['question'].lower()
+        title_words = tuple(sys.intern(word) for word in question_lower.split())
+        return cls(
+            id=entry['id'],
+            category=sys.intern(entry.get('category', '')),
+            question=entry['question'],
+            answer=entry['answer'],
+            keywords=tuple(sys.intern(keyword) for keyword in entry.get('keywords', [])),
+            aliases=tuple(alias for alias in entry.get('aliases') or [] if isinstance(alias, str)),
+            category_lower=sys.intern(entry.get('category', '').lower()),
+            question_lower=question_lower,
+            keywords_lower=tuple(sys.intern(keyword.lower()) for keyword in entry.get('keywords', [])),
+            title_words=title_words,
+            title_terms=tuple(word for word in title_words if len(word) > 2),
+        )
+
+    def __reduce__(self):
+        # Frozen slotted dataclasses cannot be restored field by field
+        return (self.__class__, tuple(getattr(self, slot) for slot in self.__slots__))
+
+class QAIndex:
+    """Vectorized scorer over all Q&A entries.
+
+    Keywords and question words are compiled into sparse term-entry
+    matrices stored as (entry, term) coordinate arrays; a query becomes a
+    term hit vector and each score is one np.bincount (a sparse
+    matrix-vector product). Concept-category matching is a dense
+    concept x entry weight matrix. Weighting matches the original
+    per-entry calculation: 0.4 keywords, 0.3 title, 0.3 concept-category.
+    """
+
+    KEYWORD_WEIGHT = 0.4
+    TITLE_WEIGHT = 0.3
+    CONCEPT_WEIGHT = 0.3
+    WORD_CACHE_SIZE = 4096
+
+    def __init__(self, entries: List[QAEntry], concept_patterns: Dict[str, Dict],
+                 concept_categories: Dict[str, List[str]]):
+        self.entries = entries
+        self.size = len(entries)
+        self.positions = {entry.id: pos for pos, entry in enumerate(entries)}
+
+        # Normalized question/alias -> entry, checked before any scoring
+        self.exact_lookup: Dict[str, QAEntry] = {}
+        for entry in entries:
+            for text in (entry.question,) + entry.aliases:
+                key = normalize_question(text)
+                if key and self.exact_lookup.setdefault(key, entry) is not entry:
+                    print(f"⚠️ Duplicate question/alias '{text}' (ids {self.exact_lookup[key].id}, {entry.id})")
+        self.question_lowers = [entry.question_lower for entry in entries]
+
+        # Keyword term-entry matrix
+        self.keyword_vocab, self.keyword_entries, self.keyword_terms = self._compile(
+            [entry.keywords_lower for entry in entries])
+        self.keyword_denominators = np.maximum(
+            np.array([len(entry.keywords_lower) for entry in entries], dtype=np.float64), 1)
+
+        # Title term-entry matrix (words longer than 2 characters, with repeats)
+        self.title_vocab, self.title_entries, self.title_terms = self._compile(
+            [entry.title_terms for entry in entries])
+        self.title_lengths = np.array([len(entry.title_words) for entry in entries], dtype=np.float64)
+
+        # Concept keyword matrix and concept-category weight matrix
+        self.concept_names = list(concept_patterns)
+        self.concept_vocab, self.concept_rows, self.concept_terms = self._compile(
+            [patterns['keywords'] for patterns in concept_patterns.values()])
+        self.concept_sizes = np.maximum(
+            np.array([len(patterns['keywords']) for patterns in concept_patterns.values()], dtype=np.float64), 1)
+        self.concept_weights = np.array([patterns['weight'] for patterns in concept_patterns.values()])
+        self.concept_category_weights = np.zeros((len(self.concept_names), self.size))
+        for row, concept in enumerate(self.concept_names):
+            markers = concept_categories.get(concept, [])
+            for pos, entry in enumerate(entries):
+                if any(marker in entry.category_lower for marker in markers):
+                    self.concept_category_weights[row, pos] = self.CONCEPT_WEIGHT
+
+        # Fuzzy vocabulary (keywords, question words, concept keywords) for rewriting
+        self.fuzzy = TrigramIndex(word for term in self.keyword_vocab + self.title_vocab + self.concept_vocab
+                                  for word in re.findall(r'\w+', term))
+
+        # Cache of "word occurs in each question" vectors for reverse title matching
+        self._word_cache: Dict[str, np.ndarray] = {}
+
+    def lookup(self, question: str) -> Optional[QAEntry]:
+        """O(1) match of a question (or registered alias) after normalization"""
+        return self.exact_lookup.get(normalize_question(question))
+
+    def rewrite(self, question: str) -> str:
+        """Replace Greeklish and misspelled words with their closest vocabulary words"""
+        words = []
+        for word in re.findall(r'\w+', question.lower()):
+            latin = word.isascii() and word.isalpha()
+            greek = greeklish_to_greek(word) if latin else word
+            forms, similarity = self.fuzzy.lookup(greek)
+            if forms is None and latin:
+                forms, similarity = self.fuzzy.lookup(word)  # Latin terms such as "moodle"
+            words.extend(forms if forms is not None else [greek])
+        return ' '.join(words)
+
+    @staticmethod
+    def _compile(rows: List[Tuple[str, ...]]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Build a vocabulary and (row, term) coordinate arrays, keeping repeats"""
+        vocab: Dict[str, int] = {}
+        row_ids, term_ids = [], []
+        for row, terms in enumerate(rows):
+            for term in terms:
+                row_ids.append(row)
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+        return list(vocab), np.array(row_ids, dtype=np.intp), np.array(term_ids, dtype=np.intp)
+
+    @staticmethod
+    def _hits(vocab: List[str], text: str) -> np.ndarray:
+        """1.0 for every vocabulary term that occurs in text (substring match)"""
+        return np.fromiter((term in text for term in vocab), dtype=np.float64, count=len(vocab))
+
+    def concept_counts(self, question_lower: str) -> np.ndarray:
+        """Number of matched keywords per concept"""
+        hits = self._hits(self.concept_vocab, question_lower)
+        return np.bincount(self.concept_rows, weights=hits[self.concept_terms],
+                           minlength=len(self.concept_names))
+
+    def concept_vector(self, question_lower: str) -> np.ndarray:
+        """Concept strengths: matched share of each concept's keywords times its weight"""
+        return self.concept_counts(question_lower) / self.concept_sizes * self.concept_weights
+
+    def _word_in_questions(self, word: str) -> np.ndarray:
+        vector = self._word_cache.get(word)
+        if vector is None:
+            vector = np.fromiter((word in question for question in self.question_lowers),
+                                 dtype=np.float64, count=self.size)
+            if len(self._word_cache) >= self.WORD_CACHE_SIZE:
+                self._word_cache.clear()
+            self._word_cache[word] = vector
+        return vector
+
+    def score_all(self, question: str) -> np.ndarray:
+        """Similarity of the question to every entry, in one vectorized pass"""
+        if not self.size:
+            return np.zeros(0)
+        question_lower = question.lower()
+
+        # Keyword score
+        keyword_hits = self._hits(self.keyword_vocab, question_lower)
+        keyword_matches = np.bincount(self.keyword_entries, weights=keyword_hits[self.keyword_terms],
+                                      minlength=self.size)
+        keyword_score = keyword_matches / self.keyword_denominators * self.KEYWORD_WEIGHT
+
+        # Title score (question words in title + title words in question)
+        question_words = [w for w in question_lower.split() if len(w) > 2]
+        title_hits = self._hits(self.title_vocab, question_lower)
+        title_matches = np.bincount(self.title_entries, weights=title_hits[self.title_terms],
+                                    minlength=self.size)
+        reverse_matches = np.zeros(self.size)
+        for word in question_words:
+            reverse_matches += self._word_in_questions(word)
+        title_score = ((title_matches + reverse_matches)
+                       / np.maximum(self.title_lengths + len(question_words), 1) * self.TITLE_WEIGHT)
+
+        # Concept-category score
+        concept_score = self.concept_vector(question_lower) @ self.concept_category_weights
+
+        return np.minimum(keyword_score + title_score + concept_score, 1.0)
+
+    def top_matches(self, question: str, max_matches: int, threshold: float) -> List[Tuple[float, QAEntry]]:
+        """Best-scoring entries above threshold, highest first"""
+        scores = self.score_all(question)
+        order = np.argsort(-scores, kind='stable')[:max_matches]
+        return [(float(scores[pos]), self.entries[pos]) for pos in order if scores[pos] > threshold]
+
+class DocumentStore:
+    """Full extracted PDF text in a memory-mapped file with a page offset table.
+
+    Pages are appended as UTF-8 to ``documents.bin``; ``documents.idx.json``
+    maps each document to the (offset, length) of every page. Text is read
+    through mmap, so whole documents stay off the Python heap and other
+    processes using the same directory share the OS page cache.
+    """
+
+    DATA_FILE = "documents.bin"
+    INDEX_FILE = "documents.idx.json"
+    VERSION = 1
+
+    def __init__(self, directory: str):
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            directory = tempfile.mkdtemp(prefix="doc_store_")
+            print(f"⚠️ Cannot use document store directory ({e}), using {directory}")
+        self.directory = directory
+        self.data_path = os.path.join(directory, self.DATA_FILE)
+        self.index_path = os.path.join(directory, self.INDEX_FILE)
+        self.documents: Dict[str, Dict] = {}
+        self._index_mtime = None
+        self._map: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+        open(self.data_path, 'ab').close()
+        self._load_index()
+
+    def _load_index(self):
+        """(Re)read the offset table and remap the data file"""
+        documents = self.documents
+        try:
+            mtime = os.path.getmtime(self.index_path)
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') == self.VERSION:
+                documents = index.get('documents', {})
+            self._index_mtime = mtime
+        except (OSError, ValueError):
+            documents = {}
+        self._publish(documents)
+
+    def _publish(self, documents: Dict[str, Dict]):
+        """Remap, then swap in the offset table.
+
+        The data file only grows, so the new map covers every old offset;
+        readers holding either table never slice past the end of the map.
+        """
+        self._remap()
+        self.documents = documents
+
+    def _remap(self):
+        size = os.path.getsize(self.data_path)
+        if size == 0:
+            self._map = None
+            return
+        with open(self.data_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _refresh(self):
+        """Pick up documents added by other processes"""
+        try:
+            if os.path.getmtime(self.index_path) != self._index_mtime:
+                with self._lock:  # never publish an older table over a concurrent put()
+                    self._load_index()
+        except OSError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def has(self, name: str) -> bool:
+        if name not in self.documents:
+            self._refresh()
+        return name in self.documents
+
+    def metadata(self, name: str) -> Dict:
+        """Latest stored metadata of a document, including other processes' updates"""
+        self._refresh()
+        return self.documents.get(name, {})
+
+    def put(self, name: str, pages: List[str], **metadata) -> bool:
+        """Append a document's pages and publish them in the offset table.
+
+        Returns False without writing when the same content (sha256) is
+        already stored, e.g. because another process fetched it first.
+        """
+        with self._lock, open(self.data_path, 'ab') as data:
+            if fcntl:
+                fcntl.flock(data, fcntl.LOCK_EX)
+            try:
+                self._load_index()  # merge entries written by other processes
+                stored = self.documents.get(name, {})
+                if metadata.get('sha256') and stored.get('sha256') == metadata['sha256']:
+                    return False
+                data.seek(0, os.SEEK_END)
+                offset = data.tell()
+                table = []
+                for page in pages:
+                    encoded = page.encode('utf-8')
+                    data.write(encoded)
+                    table.append([offset, len(encoded)])
+                    offset += len(encoded)
+                data.flush()
+
+                documents = dict(self.documents)
+                documents[name] = dict(metadata, pages=table)
+                tmp_path = self.index_path + f".{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'version': self.VERSION, 'documents': documents}, f, ensure_ascii=False)
+                os.replace(tmp_path, self.index_path)
+                self._index_mtime = os.path.getmtime(self.index_path)
+                self._publish(documents)
+            finally:
+                if fcntl:
+                    fcntl.flock(data, fcntl.LOCK_UN)
+        return True
+
+    def page_count(self, name: str) -> int:
+        return len(self.documents.get(name, {}).get('pages', []))
+
+    def page(self, name: str, number: int) -> str:
+        """Decode a single page straight from the mapped file"""
+        offset, length = self.documents[name]['pages'][number]
+        return self._map[offset:offset + length].decode('utf-8') if length else ""
+
+    def pages(self, name: str):
+        for number in range(self.page_count(name)):
+            yield self.page(name, number)
+
+    def text(self, name: str, separator: str = "\n") -> str:
+        return separator.join(self.pages(name))
+
+    def nbytes(self) -> int:
+        """Bytes of live page text (excluding superseded versions)"""
+        return sum(length for document in self.documents.values() for offset, length in document['pages'])
+
+class IndexSnapshot:
+    """Versioned pickle of the derived Q&A structures, keyed by a hash of their sources.
+
+    The file holds a small header (version, source hash, build time)
+    followed by the payload, so a stale snapshot is rejected without
+    unpickling it. The hash covers this module's source, so any change to
+    the code that builds the indexes invalidates existing snapshots.
+    Unpickling runs code, so only snapshots owned by the current user and
+    not writable by others are loaded.
+    """
+
+    VERSION = 1
+    _code_digest: Optional[bytes] = None
+
+    @classmethod
+    def code_digest(cls) -> bytes:
+        """Hash of this module's source (the code the snapshot's structures come from)"""
+        if cls._code_digest is None:
+            with open(os.path.abspath(__file__), 'rb') as f:
+                cls._code_digest = hashlib.sha256(f.read()).digest()
+        return cls._code_digest
+
+    def __init__(self, path: str):
+        self.path = path
+        self.status = 'disabled'
+        self.load_ms = 0.0
+        self.build_ms = 0.0
+        self.saved_ms = 0.0
+
+    @classmethod
+    def source_hash(cls, *sources) -> str:
+        """Hash of the snapshot format and every input the structures are derived from"""
+        digest = hashlib.sha256(f"{cls.VERSION}|{sys.version_info[:2]}|{np.__version__}".encode())
+        digest.update(cls.code_digest())
+        for source in sources:
+            if not isinstance(source, bytes):
+                source = json.dumps(source, sort_keys=True, ensure_ascii=False).encode('utf-8')
+            digest.update(hashlib.sha256(source).digest())
+        return digest.hexdigest()
+
+    def load(self, source_hash: str) -> Optional[Dict[str, Any]]:
+        """Payload of a snapshot matching source_hash, else None (status says why)"""
+        started = time.perf_counter()
+        try:
+            with open(self.path, 'rb') as f:
+                info = os.fstat(f.fileno())
+                if hasattr(os, 'getuid') and (info.st_uid != os.getuid() or info.st_mode & 0o022):
+                    print(f"⚠️ Ignoring index snapshot {self.path}: not owned by this user or writable by others")
+                    self.status = 'untrusted'
+                    return None
+                header = pickle.load(f)
+                if header.get('version') != self.VERSION or header.get('source') != source_hash:
+                    self.status = 'stale'
+                    return None
+                payload = pickle.load(f)
+        except FileNotFoundError:
+            self.status = 'missing'
+            return None
+        except Exception as e:
+            print(f"⚠️ Unreadable index snapshot {self.path}: {e}")
+            self.status = 'error'
+            return None
+        self.load_ms = (time.perf_counter() - started) * 1000
+        self.build_ms = header.get('build_ms', 0.0)
+        self.saved_ms = max(self.build_ms - self.load_ms, 0.0)
+        self.status = 'loaded'
+        print(f"⚡ Index snapshot loaded in {self.load_ms:.1f}ms (build took {self.build_ms:.1f}ms)")
+        return payload
+
+    def save(self, source_hash: str, payload: Dict[str, Any], build_ms: float):
+        """Write the snapshot atomically; failures only cost the next cold start"""
+        self.build_ms = build_ms
+        header = {'version': self.VERSION, 'source': source_hash, 'build_ms': build_ms,
+                  'created': datetime.datetime.now().isoformat()}
+        try:
+            directory = os.path.dirname(self.path) or '.'
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self.status = 'saved'
+        except Exception as e:
+            print(f"⚠️ Could not write index snapshot: {e}")
+            self.status = 'error'
+
+class SharedCache:
+    """Cross-process cache tier: SQLite in WAL mode with an in-process LRU in front.
+
+    Several app processes on one host (and restarts of the same process)
+    share LLM answers and metric counters through one database file. Values
+    are JSON; entries may expire. Database errors degrade to cache misses.
+    """
+
+    def __init__(self, path: str, lru_size: int = 512, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.lru_size = lru_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self._lru: 'OrderedDict[Tuple[str, str], Tuple[Any, Optional[float]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {'lru_hits': 0, 'db_hits': 0, 'misses': 0, 'errors': 0}
+        try:
+            with self._connection() as db:
+                db.execute("CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key TEXT, value TEXT, "
+                           "expires REAL, PRIMARY KEY (namespace, key))")
+                db.execute("CREATE TABLE IF NOT EXISTS metrics (name TEXT PRIMARY KEY, value REAL)")
+                db.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+        except sqlite3.Error as e:
+            self._error("initialize", e)
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not shared across threads)"""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _error(self, action: str, error: Exception):
+        self.stats['errors'] += 1
+        print(f"⚠️ Shared cache {action} failed: {error}")
+
+    def _remember(self, lru_key: Tuple[str, str], value: Any, expires: Optional[float]):
+        with self._lock:
+            self._lru[lru_key] = (value, expires)
+            self._lru.move_to_end(lru_key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        lru_key = (namespace, key)
+        now = time.time()
+        with self._lock:
+            cached = self._lru.get(lru_key)
+            if cached is not None:
+                if cached[1] is None or cached[1] > now:
+                    self._lru.move_to_end(lru_key)
+                    self.stats['lru_hits'] += 1
+                    return cached[0]
+                del self._lru[lru_key]
+        try:
+            row = self._connection().execute(
+                "SELECT value, expires FROM cache WHERE namespace = ? AND key = ? "
+                "AND (expires IS NULL OR expires > ?)", (namespace, key, now)).fetchone()
+        except sqlite3.Error as e:
+            self._error("read", e)
+            return None
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+        value = json.loads(row[0])
+        self._remember(lru_key, value, row[1])
+        self.stats['db_hits'] += 1
+        return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        expires = time.time() + ttl if ttl else None
+        self._remember((namespace, key), value, expires)
+        try:
+            with self._connection() as db:
+                db.execute("INSERT OR REPLACE INTO cache (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                           (namespace, key, json.dumps(value, ensure_ascii=False), expires))
+        except sqlite3.Error as e:
+            self._error("write", e)
+
+    def incr(self, name: str, amount: float = 1):
+        """Add to a metric counter shared by all processes"""
+        try:
+            with self._connection() as db:
+                db.execute("INSERT INTO metrics (name, value) VALUES (?, ?) "
+                           "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, amount))
+        except sqlite3.Error as e:
+            self._error("metric update", e)
+
+    def metrics(self) -> Dict[str, float]:
+        try:
+            return dict(self._connection().execute("SELECT name, value FROM metrics ORDER BY name").fetchall())
+        except sqlite3.Error as e:
+            self._error("metric read", e)
+            return {}
+
+class TraceRecorder:
+    """Appends one JSON line per answered request, for offline replay (replay_traces.py).
+
+    A trace holds what is needed to re-run the request deterministically:
+    the previous turn's context, whether the LLM and the pregenerated store
+    were enabled, the PDF passages used and the raw LLM response, next to
+    the path, ids and per-stage timings.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def record(self, chatbot: 'OptimizedInternshipChatbot', question: str, details: Dict,
+               previous: Optional[Dict] = None):
+        concepts = details.get('concepts')
+        if concepts is None:
+            concepts = chatbot.extract_concepts(question)
+        trace = {
+            'version': self.VERSION,
+            'time': datetime.datetime.now().isoformat(timespec='milliseconds'),
+            'question': question,
+            'normalized': normalize_question(question),
+            'rewritten': details.get('rewritten'),
+            'context': previous,
+            'follow_up': details['follow_up'],
+            'llm_enabled': chatbot.groq_client is not None,
+            'pregenerated_enabled': chatbot.pregenerated is not None,
+            'concepts': {name: round(float(score), 4) for name, score in concepts.items()},
+            'candidates': details.get('candidates', []),
+            'similarity': round(float(details['similarity']), 4),
+            'path': details['path'],
+            'qa_id': details['qa_id'],
+            'route': details.get('route'),
+            'model': details.get('model'),
+            'passages': details.get('passages'),
+            'prompt_chars': details.get('prompt_chars'),
+            'conversation_chars': details.get('conversation_chars'),
+            'llm_response': details.get('llm_response'),
+            'answer': details['answer'],
+            'timings': {stage: round(ms, 3) for stage, ms in details['timings'].items()},
+        }
+        line = json.dumps(trace, ensure_ascii=False) + "\n"
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                f.write(line)
+            self.recorded += 1
+        except OSError as e:
+            print(f"⚠️ Could not write trace: {e}")
+
+class DocumentSync:
+    """Keeps remote PDFs in the document store fresh with conditional GETs.
+
+    ETag/Last-Modified validators are stored with each document. A
+    background thread revalidates stored documents every interval seconds
+    and re-extracts only when the server answers 200 with new content;
+    readers keep getting the stored (possibly stale) text meanwhile.
+    """
+
+    def __init__(self, doc_store: DocumentStore, base_url: str,
+                 extract: Callable[[bytes], List[str]], interval: int = 3600, timeout: int = 15):
+        self.doc_store = doc_store
+        self.base_url = base_url
+        self.extract = extract
+        self.interval = interval
+        self.timeout = timeout
+        self.stats = {'downloaded': 0, 'not_modified': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+        self.last_checked: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._fetch_lock = threading.Lock()
+
+    def _store(self, name: str, response) -> bool:
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        return self.doc_store.put(name, self.extract(response.content), sha256=content_hash,
+                                  etag=response.headers.get('ETag'),
+                                  last_modified=response.headers.get('Last-Modified'))
+
+    def ensure(self, name: str) -> bool:
+        """Make sure a document is stored, downloading it on first use"""
+        if self.doc_store.has(name):
+            return True
+        with self._fetch_lock:
+            if self.doc_store.has(name):  # fetched by another thread meanwhile
+                return True
+            response = requests.get(self.base_url + name, timeout=self.timeout)
+            response.raise_for_status()
+            self._store(name, response)
+            self.last_checked[name] = time.time()
+            self.stats['downloaded'] += 1
+        return True
+
+    def revalidate(self, name: str) -> str:
+        """Conditional GET for a stored document; re-extract only on 200"""
+        # Validators as stored by any process, so one upstream change is fetched once
+        metadata = self.doc_store.metadata(name)
+        headers = {}
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+        try:
+            response = requests.get(self.base_url + name, headers=headers, timeout=self.timeout)
+            self.last_checked[name] = time.time()
+            if response.status_code == 304:
+                self.stats['not_modified'] += 1
+                return 'not_modified'
+            response.raise_for_status()
+            if hashlib.sha256(response.content).hexdigest() == metadata.get('sha256'):
+                self.stats['unchanged'] += 1  # server sent no validators; content is the same
+                return 'unchanged'
+            if not self._store(name, response):
+                self.stats['unchanged'] += 1  # another process stored this version meanwhile
+                return 'unchanged'
+            self.stats['updated'] += 1
+            print(f"🔄 Updated {name} from upstream")
+            return 'updated'
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"⚠️ Revalidation failed for {name}: {e}")
+            return 'error'
+
+    def revalidate_all(self) -> Dict[str, str]:
+        return {name: self.revalidate(name) for name in list(self.doc_store.documents)}
+
+    def start(self):
+        """Revalidate stored documents in a background thread every interval seconds"""
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="document-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.revalidate_all()
+
+# Groq routes: the first route whose conditions all hold is used (last = default).
+# Conditions: min/max_concepts, min/max_words, min/max_confidence (best similarity).
+DEFAULT_MODEL_ROUTES = [
+    {"name": "fast", "model": "llama-3.1-8b-instant", "max_tokens": 400,
+     "max_concepts": 1, "max_words": 8},
+    {"name": "large", "model": "llama-3.3-70b-versatile", "max_tokens": 1500, "min_concepts": 3},
+    {"name": "large", "model": "llama-3.3-70b-versatile", "max_tokens": 1500,
+     "min_words": 25, "max_confidence": 0.1},
+    {"name": "standard", "model": "llama-3.1-8b-instant", "max_tokens": 1000},
+]
+
+class ModelRouter:
+    """Chooses the Groq model and output budget from query features; tracks latency per route"""
+
+    CONDITIONS = {
+        'min_concepts': lambda features, bound: features['concepts'] >= bound,
+        'max_concepts': lambda features, bound: features['concepts'] <= bound,
+        'min_words': lambda features, bound: features['words'] >= bound,
+        'max_words': lambda features, bound: features['words'] <= bound,
+        'min_confidence': lambda features, bound: features['confidence'] >= bound,
+        'max_confidence': lambda features, bound: features['confidence'] <= bound,
+    }
+
+    def __init__(self, routes: Optional[List[Dict]] = None, window: int = 200):
+        self.routes = routes or DEFAULT_MODEL_ROUTES
+        error = self.validate(self.routes)
+        if error:
+            raise ValueError(f"Invalid model routes: {error}")
+        self._latencies: Dict[str, deque] = {}
+        self._window = window
+        self._lock = threading.Lock()
+
+    @classmethod
+    def validate(cls, routes: Any) -> Optional[str]:
+        """Why a routing table cannot be used, or None if it is valid"""
+        if not isinstance(routes, list) or not routes:
+            return "expected a non-empty list of routes"
+        for number, route in enumerate(routes, start=1):
+            if not isinstance(route, dict):
+                return f"route {number} is not an object"
+            if not isinstance(route.get('model'), str) or not route['model']:
+                return f"route {number} has no 'model'"
+            max_tokens = route.get('max_tokens')
+            if isinstance(max_tokens, bool) or not isinstance(max_tokens, int) or max_tokens <= 0:
+                return f"route {number} needs a positive integer 'max_tokens'"
+            unknown = set(route) - set(cls.CONDITIONS) - {'name', 'model', 'max_tokens'}
+            if unknown:
+                return f"route {number} has unknown conditions: {', '.join(sorted(unknown))}"
+            for key in cls.CONDITIONS:
+                if key in route and (isinstance(route[key], bool) or not isinstance(route[key], (int, float))):
+                    return f"route {number} condition '{key}' must be a number"
+        return None
+
+    @classmethod
+    def from_json(cls, routes_json: str) -> 'ModelRouter':
+        """Router from a JSON routing table (falls back to the defaults if invalid)"""
+        if routes_json:
+            try:
+                routes = json.loads(routes_json)
+            except ValueError as e:
+                print(f"⚠️ Invalid MODEL_ROUTES JSON: {e}")
+                return cls()
+            error = cls.validate(routes)
+            if error is None:
+                return cls(routes)
+            print(f"⚠️ Invalid MODEL_ROUTES ({error}), using the default routes")
+        return cls()
+
+    def select(self, question: str, concepts: Dict[str, float], confidence: float) -> Dict:
+        features = {
+            'concepts': len(concepts),
+            'words': len(question.split()),
+            'confidence': confidence,
+        }
+        for route in self.routes:
+            if all(check(features, route[key]) for key, check in self.CONDITIONS.items() if key in route):
+                return route
+        return self.routes[-1]
+
+    def record(self, route_name: str, latency_ms: float):
+        with self._lock:
+            self._latencies.setdefault(route_name, deque(maxlen=self._window)).append(latency_ms)
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Calls and latency percentiles (ms) per route over the recent window"""
+        with self._lock:
+            items = [(name, sorted(values)) for name, values in self._latencies.items()]
+        return [{
+            'route': name,
+            'calls': len(values),
+            'p50_ms': round(values[len(values) // 2], 1),
+            'p95_ms': round(values[min(int(len(values) * 0.95), len(values) - 1)], 1),
+            'max_ms': round(values[-1], 1),
+        } for name, values in items if values]
+
+class LLMGate:
+    """Process-wide single-flight coalescing and concurrency limit for LLM calls.
+
+    Concurrent calls with the same key wait for the one in-flight call and
+    all receive its result (or its error); at most max_concurrent calls
+    reach the API at any time.
+    """
+
+    class _Call:
+        __slots__ = ('done', 'result', 'error')
+
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self, max_concurrent: int = 4):
+        self.max_concurrent = max(max_concurrent, 1)
+        self._limiter = threading.BoundedSemaphore(self.max_concurrent)
+        self._calls: Dict[str, 'LLMGate._Call'] = {}
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'coalesced': 0, 'errors': 0}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def run(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+                self.stats['calls'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with self._limiter:
+                call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            self.stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+class PregeneratedAnswers:
+    """Vetted LLM answers generated offline (pregenerate_answers.py), served without a Groq call.
+
+    Answers are keyed by normalized question. Only entries a reviewer
+    marked ``"approved": true`` are served, and only while qa_data.json
+    still has the hash recorded at generation time.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str, qa_source_hash: str):
+        self.path = path
+        self.answers: Dict[str, Dict[str, Any]] = {}
+        self.status = 'missing'
+        self.hits = 0
+        self.pending = 0  # entries awaiting review
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                store = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Cannot read pregenerated answers {path}: {e}")
+            self.status = 'error'
+            return
+        if store.get('version') != self.VERSION or store.get('qa_source_hash') != qa_source_hash:
+            print("⚠️ Pregenerated answers were built for different Q&A data, not serving them")
+            self.status = 'stale'
+            return
+        for item in store.get('answers', []):
+            if not item.get('answer'):
+                continue
+            if item.get('approved') is True:
+                self.answers.setdefault(normalize_question(item['question']), item)
+            else:
+                self.pending += 1
+        self.status = 'loaded'
+        print(f"✅ Loaded {len(self.answers)} pregenerated answers ({self.pending} awaiting review)")
+
+    @staticmethod
+    def source_hash(qa_source: bytes) -> str:
+        return hashlib.sha256(qa_source).hexdigest()
+
+    def lookup(self, *questions: Optional[str]) -> Optional[Dict[str, Any]]:
+        """First stored answer for any of the given phrasings"""
+        for question in questions:
+            if question:
+                item = self.answers.get(normalize_question(question))
+                if item is not None:
+                    self.hits += 1
+                    return item
+        return None
+
+class Retriever(Protocol):
+    """Q&A retrieval engine: top-k entries with similarity in [0, 1], highest first"""
+    name: str
+
+    def retrieve(self, question: str, k: int) -> List[Tuple[float, QAEntry]]:
+        ...
+
+class HeuristicRetriever:
+    """Baseline engine: keyword/title/concept scoring of QAIndex"""
+    name = 'heuristic'
+
+    def __init__(self, qa_index: QAIndex):
+        self.qa_index = qa_index
+
+    def retrieve(self, question: str, k: int) -> List[Tuple[float, QAEntry]]:
+        return self.qa_index.top_matches(question, k, -1.0)
+
+class BM25Retriever:
+    """Okapi BM25 over an inverted index of question, alias and keyword tokens.
+
+    Tokens are normalized (no accents/case) and cut to a short prefix as a
+    cheap stand-in for Greek stemming. Scores are divided by the query's
+    maximum attainable BM25 score so thresholds stay in [0, 1].
+    """
+    name = 'bm25'
+    K1 = 1.5
+    B = 0.75
+    PREFIX = 6
+
+    def __init__(self, entries: List[QAEntry]):
+        self.entries = entries
+        documents = [self.tokenize(' '.join((entry.question,) + entry.aliases + entry.keywords))
+                     for entry in entries]
+        lengths = np.array([len(doc) for doc in documents], dtype=np.float64)
+        average_length = lengths.mean() if len(lengths) else 0.0
+
+        term_frequencies: Dict[str, Dict[int, int]] = {}
+        for pos, doc in enumerate(documents):
+            for term in doc:
+                postings = term_frequencies.setdefault(term, {})
+                postings[pos] = postings.get(pos, 0) + 1
+
+        self.idf: Dict[str, float] = {}
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, postings in term_frequencies.items():
+            idf = float(np.log(1 + (len(entries) - len(postings) + 0.5) / (len(postings) + 0.5)))
+            positions = np.fromiter(postings.keys(), dtype=np.intp, count=len(postings))
+            tf = np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+            norm = self.K1 * (1 - self.B + self.B * lengths[positions] / average_length)
+            self.idf[term] = idf
+            self.postings[term] = (positions, idf * tf * (self.K1 + 1) / (tf + norm))
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        return [token[:cls.PREFIX] for token in normalize_question(text).split() if len(token) > 2]
+
+    def retrieve(self, question: str, k: int) -> List[Tuple[float, QAEntry]]:
+        scores = np.zeros(len(self.entries))
+        upper_bound = 0.0
+        for term in set(self.tokenize(question)):
+            if term in self.postings:
+                positions, weights = self.postings[term]
+                scores[positions] += weights
+                upper_bound += self.idf[term] * (self.K1 + 1)
+        if upper_bound:
+            scores /= upper_bound
+        order = np.argsort(-scores, kind='stable')[:k]
+        return [(float(scores[pos]), self.entries[pos]) for pos in order]
+
+# Registered retrieval engines, selected with the RETRIEVER_ENGINE setting
+RETRIEVERS: Dict[str, Callable[['OptimizedInternshipChatbot'], Retriever]] = {
+    'heuristic': lambda chatbot: HeuristicRetriever(chatbot.qa_index),
+    'bm25': lambda chatbot: BM25Retriever(chatbot.qa_data),
+}
+
+@dataclass(frozen=True)
+class ConceptFallback:
+    """Fallback answer with its chat HTML, both rendered once at load time"""
+    __slots__ = ('id', 'answer', 'html')
+
+    id: str
+    answer: str
+    html: str
+
+class ConceptFallbacks:
+    """Declarative concept → answer table for the last-resort fallback.
+
+    Entries come from concept_fallbacks.json and are tried in file order: an
+    entry applies when its concept is the question's strongest one or one of
+    its keywords occurs in the question. Anything else gets the default answer.
+    """
+    FILENAME = "concept_fallbacks.json"
+    DEFAULT_ANSWER = """Δεν βρέθηκε συγκεκριμένη απάντηση για αυτή την ερώτηση.
+
+ΠΡΟΤΕΙΝΟΜΕΝΕΣ ΕΝΕΡΓΕΙΕΣ:
+• Διατυπώστε την ερώτηση πιο συγκεκριμένα
+• Επιλέξτε από τις συχνές ερωτήσεις στο μενού
+• Επικοινωνήστε απευθείας με τον υπεύθυνο
+
+ΕΠΙΚΟΙΝΩΝΙΑ:
+📧 gsofianidis@mitropolitiko.edu.gr
+📞 2314 409000
+
+Για άμεση βοήθεια, περιγράψτε τη συγκεκριμένη απορία σας."""
+
+    def __init__(self, entries: List[Dict], concept_names: List[str], assistant_name: str):
+        def build(entry_id: str, answer: str) -> ConceptFallback:
+            return ConceptFallback(entry_id, answer, render_message_html("assistant", answer, assistant_name))
+
+        self.entries = [build(str(entry['id']), entry['answer']) for entry in entries]
+        self.default = build('default', self.DEFAULT_ANSWER)
+        self.by_id = {fallback.id: fallback for fallback in self.entries + [self.default]}
+        
+        # First entry for each concept row of the concept vector (len(entries): none)
+        first_row: Dict[str, int] = {}
+        for row, entry in enumerate(entries):
+            first_row.setdefault(entry.get('concept'), row)
+        self.concept_rows = np.array([first_row.get(name, len(entries)) for name in concept_names], dtype=np.intp)
+        # (keyword, entry row), ordered by row so lookups stop at the first applicable entry
+        self.keywords = [(keyword.lower(), row) for row, entry in enumerate(entries)
+                         for keyword in entry.get('keywords', [])]
+
+    @classmethod
+    def load(cls, concept_names: List[str], assistant_name: str, path: str = FILENAME) -> 'ConceptFallbacks':
+        entries: List[Dict] = []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, list) and all(isinstance(entry, dict) and 'id' in entry and 'answer' in entry
+                                               for entry in data):
+                entries = data
+            else:
+                print(f"❌ Invalid data format in {path}")
+        except FileNotFoundError:
+            print(f"ℹ️ {path} not found, using the default fallback only")
+        except (OSError, ValueError) as e:
+            print(f"❌ Error loading {path}: {e}")
+        print(f"✅ Loaded {len(entries)} concept fallbacks")
+        return cls(entries, concept_names, assistant_name)
+
+    def resolve(self, strengths: np.ndarray, question_lower: str) -> ConceptFallback:
+        """Fallback for a question, given its concept-strength vector"""
+        row = len(self.entries)
+        top = int(np.argmax(strengths)) if strengths.size else -1
+        if top >= 0 and strengths[top] > 0:
+            row = int(self.concept_rows[top])
+        for keyword, keyword_row in self.keywords:
+            if keyword_row >= row:
+                break
+            if keyword in question_lower:
+                row = keyword_row
+                break
+        return self.entries[row] if row < len(self.entries) else self.default
+
+class RetrievalContext:
+    """Last turn's retrieval results, kept per session and reused for follow-ups"""
+    __slots__ = ('question', 'qa_ids', 'passages')
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.question: Optional[str] = None
+        self.qa_ids: Tuple[int, ...] = ()
+        self.passages: Optional[str] = None  # None: PDFs not searched for this topic yet
+
+    def update(self, question: str, qa_ids: List[int], passages: Optional[str] = None):
+        self.question = question
+        self.qa_ids = tuple(qa_ids)
+        self.passages = passages
+
+class ConversationMemory:
+    """Per-session turn memory for LLM prompts, bounded by a fixed token budget.
+
+    The latest turns are kept verbatim; older turns are compacted into one
+    summary line each, and the oldest summary lines are folded into a short
+    topic list, so the rendered memory stays within
+    recent_tokens + summary_tokens (plus two headers) however long the
+    conversation runs.
+    """
+    __slots__ = ('recent_turns', 'recent_tokens', 'summary_tokens', 'recent', 'summary', 'topics', 'turns')
+
+    CHARS_PER_TOKEN = 2.5  # rough estimate; Greek text tokenizes denser than English
+    SUMMARY_QUESTION_CHARS = 120
+    SUMMARY_ANSWER_CHARS = 160
+    TOPIC_CHARS = 40
+    MAX_TOPICS = 6
+
+    def __init__(self, recent_turns: int = 2, recent_tokens: int = 500, summary_tokens: int = 250):
+        self.recent_turns = max(recent_turns, 1)
+        self.recent_tokens = recent_tokens
+        self.summary_tokens = summary_tokens
+        self.clear()
+
+    def clear(self):
+        self.recent: deque = deque()  # (question, answer) kept verbatim
+        self.summary: deque = deque()  # (question, compacted line) per older turn
+        self.topics: deque = deque()  # questions of turns dropped from the summary
+        self.turns = 0
+
+    @classmethod
+    def tokens(cls, text: str) -> int:
+        return int(len(text) / cls.CHARS_PER_TOKEN + 0.999)
+
+    @staticmethod
+    def _clip(text: str, limit: int) -> str:
+        return text if len(text) <= limit else text[:max(limit - 1, 0)].rstrip() + '…'
+
+    def add_turn(self, question: str, answer: str):
+        self.turns += 1
+        self.recent.append((question, answer))
+        while len(self.recent) > self.recent_turns or (
+                len(self.recent) > 1 and self.tokens(self._render_recent(clip=False)) > self.recent_tokens):
+            self._compact(*self.recent.popleft())
+
+    def _compact(self, question: str, answer: str):
+        """Replace a turn by a summary line, folding the oldest lines into topics"""
+        question = ' '.join(question.split())
+        first_line = ' '.join(next((line for line in answer.splitlines() if line.strip()), "").split())
+        self.summary.append((question, f"- {self._clip(question, self.SUMMARY_QUESTION_CHARS)} → "
+                                       f"{self._clip(first_line, self.SUMMARY_ANSWER_CHARS)}"))
+        while self.tokens(self._render_summary()) > self.summary_tokens:
+            if self.summary:
+                oldest_question, _ = self.summary.popleft()
+                topic = self._clip(oldest_question, self.TOPIC_CHARS)
+                if topic in self.topics:
+                    self.topics.remove(topic)
+                self.topics.append(topic)
+                if len(self.topics) > self.MAX_TOPICS:
+                    self.topics.popleft()
+            elif self.topics:
+                self.topics.popleft()
+            else:
+                break
+
+    def _render_summary(self) -> str:
+        lines = [f"Νωρίτερα θέματα: {' | '.join(self.topics)}"] if self.topics else []
+        return "\n".join(lines + [line for _, line in self.summary])
+
+    def _render_recent(self, clip: bool = True) -> str:
+        turns = [f"ΦΟΙΤΗΤΗΣ: {question}\nΒΟΗΘΟΣ: {answer}" for question, answer in self.recent]
+        text = "\n".join(turns)
+        if clip:
+            # A single very long answer is cut so the verbatim part stays in budget
+            text = self._clip(text, int(self.recent_tokens * self.CHARS_PER_TOKEN))
+        return text
+
+    def render(self) -> str:
+        """Prompt section with the summary and recent turns ('' before the first turn)"""
+        parts = []
+        summary = self._render_summary()
+        if summary:
+            parts.append(f"ΣΥΝΟΨΗ ΠΡΟΗΓΟΥΜΕΝΗΣ ΣΥΖΗΤΗΣΗΣ:\n{summary}")
+        if self.recent:
+            parts.append(f"ΠΡΟΣΦΑΤΗ ΣΥΖΗΤΗΣΗ:\n{self._render_recent()}")
+        return "\n\n".join(parts)
 
 class OptimizedInternshipChatbot:
-    def __init__(self, groq_api_key: str = None):
+    def __init__(self, groq_api_key: str = None, retriever: str = 'heuristic',
+                 doc_store_dir: str = ".doc_store",
+                 doc_base_url: str = "https://raw.githubusercontent.com/GiorgosBouh/chatbot.placement/main/",
+                 doc_revalidate_seconds: int = 3600,
+                 model_router: Optional[ModelRouter] = None,
+                 llm_max_concurrency: int = 4,
+                 use_index_snapshot: bool = True,
+                 pregenerated_path: Optional[str] = "pregenerated_answers.json",
+                 shared_cache: Optional[SharedCache] = None,
+                 llm_cache_ttl: int = 86400,
+                 trace_recorder: Optional[TraceRecorder] = None):
         # Initialize Groq client
         self.groq_client = None
         if GROQ_AVAILABLE and groq_api_key:
@@ -75,11 +1311,32 @@ class OptimizedInternshipChatbot:
             except Exception as e:
                 print(f"⚠️ Failed to initialize Groq: {e}")
         
-        # Load Q&A data
-        self.qa_data = self.load_qa_data()
+        # Model/output-budget routing for Groq calls
+        self.model_router = model_router or ModelRouter()
+        
+        # Coalesces identical in-flight Groq calls and caps concurrent ones
+        self.llm_gate = LLMGate(llm_max_concurrency)
+        
+        # Optional cross-process cache for LLM answers and metrics
+        self.shared_cache = shared_cache
+        self.llm_cache_ttl = llm_cache_ttl
+        
+        # Optional per-request trace capture for offline replay
+        self.trace_recorder = trace_recorder
+        
+        # Q&A retrieval engine (see RETRIEVERS)
+        if retriever not in RETRIEVERS:
+            print(f"⚠️ Unknown retriever '{retriever}', using 'heuristic'")
+            retriever = 'heuristic'
+        self.retriever_name = retriever
         
-        # Initialize PDF files cache with memory optimization
-        self.pdf_cache = {}
+        # Q&A data is loaded with its indexes below, once the concept tables exist
+        self._qa_mtime = self._get_qa_mtime()
+        
+        # Extracted PDF text lives in a memory-mapped store, not on the heap
+        self.doc_store = DocumentStore(doc_store_dir)
+        self.doc_sync = DocumentSync(self.doc_store, doc_base_url, self.extract_pdf_pages,
+                                     interval=doc_revalidate_seconds)
         self.pdf_files = [
             "1.ΑΙΤΗΣΗ ΠΡΑΓΜΑΤΟΠΟΙΗΣΗΣ ΠΡΑΚΤΙΚΗΣ ΑΣΚΗΣΗΣ.pdf",
             "2.ΣΤΟΙΧΕΙΑ ΔΟΜΗΣ_ΟΔΗΓΙΕΣ.pdf", 
@@ -122,6 +1379,33 @@ class OptimizedInternshipChatbot:
             }
         }
         
+        # Q&A categories that each concept boosts in similarity scoring
+        self.concept_categories = {
+            'documents': ['έγγραφα', 'διαδικασίες'],
+            'facilities': ['δομές', 'φορείς'],
+            'time': ['ώρες', 'χρονοδιάγραμμα'],
+            'money': ['οικονομικά'],
+            'contact': ['επικοινωνία']
+        }
+        
+        # Derived Q&A structures are reused across cold starts while their sources are unchanged
+        self.index_snapshot = IndexSnapshot(os.path.join(self.doc_store.directory, "index_snapshot.pkl"))
+        self.use_index_snapshot = use_index_snapshot
+        self._load_knowledge_base()
+        
+        # Offline-generated LLM answers for anticipated questions (None disables)
+        self.pregenerated_path = pregenerated_path
+        self._load_pregenerated()
+        
+        # Pronouns and adverbs that refer back to the previous turn (articles and
+        # prepositions open new questions just as often, so they don't count)
+        self.follow_up_words = {
+            'αυτό', 'αυτο', 'αυτά', 'αυτα', 'αυτή', 'αυτη', 'αυτές', 'αυτες', 'αυτός', 'αυτος',
+            'αυτού', 'αυτου', 'αυτής', 'αυτης', 'αυτών', 'αυτων', 'εκεί', 'εκει', 'τότε', 'τοτε',
+            'μετά', 'μετα', 'μέχρι', 'μεχρι', 'πότε', 'ποτε', 'επίσης', 'επισης', 'δηλαδή', 'δηλαδη'
+        }
+        self.follow_up_max_words = 4
+        
         # Enhanced system prompt for optimized AI
         self.system_prompt = """Είσαι ένας εξειδικευμένος σύμβουλος για θέματα πρακτικής άσκησης στο Μητροπολιτικό Κολλέγιο Θεσσαλονίκης, τμήμα Προπονητικής και Φυσικής Αγωγής.
 
@@ -161,7 +1445,7 @@ class OptimizedInternshipChatbot:
 
 Απάντησε πάντα στα ελληνικά με επαγγελματικό τόνο χρησιμοποιώντας εξυπνη ανάλυση."""
 
-    def load_qa_data(self) -> List[Dict]:
+    def load_qa_data(self) -> List[QAEntry]:
         """Load Q&A data with memory optimization"""
         filename = "qa_data.json"
         
@@ -186,16 +1470,101 @@ class OptimizedInternshipChatbot:
                     return self.get_enhanced_fallback_data()
             
             print(f"✅ Successfully loaded {len(data)} Q&A entries")
-            return data
+            return [QAEntry.from_dict(entry) for entry in data]
             
         except Exception as e:
             print(f"❌ Error loading {filename}: {e}")
             return self.get_enhanced_fallback_data()
 
-    def get_enhanced_fallback_data(self) -> List[Dict]:
+    def _get_qa_mtime(self) -> Tuple[Optional[float], ...]:
+        """Modification times of the knowledge-base files (None if missing)"""
+        mtimes = []
+        for filename in ("qa_data.json", ConceptFallbacks.FILENAME):
+            try:
+                mtimes.append(os.path.getmtime(filename))
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def _index_qa_data(self):
+        """Build id lookups and the scoring index over qa_data, reset rendered HTML"""
+        self.qa_by_id = {qa.id: qa for qa in self.qa_data}
+        self.qa_index = QAIndex(self.qa_data, self.concept_patterns, self.concept_categories)
+        self.retriever = RETRIEVERS[self.retriever_name](self)
+        self._qa_html_cache = {}
+
+    def _read_qa_source(self) -> bytes:
+        """Raw bytes of qa_data.json (empty if missing), for source hashing"""
+        try:
+            with open("qa_data.json", 'rb') as f:
+                return f.read()
+        except OSError:
+            return b""
+
+    def _load_pregenerated(self):
+        self.pregenerated = None
+        if self.pregenerated_path:
+            self.pregenerated = PregeneratedAnswers(
+                self.pregenerated_path, PregeneratedAnswers.source_hash(self._read_qa_source()))
+
+    def _load_knowledge_base(self):
+        """Load Q&A entries and indexes from a matching snapshot, or build and snapshot them"""
+        self.concept_fallbacks = ConceptFallbacks.load(list(self.concept_patterns), self.assistant_name)
+        if not self.use_index_snapshot:
+            self.qa_data = self.load_qa_data()
+            self._index_qa_data()
+            return
+        
+        source_hash = IndexSnapshot.source_hash(self._read_qa_source(), self.concept_patterns,
+                                                self.concept_categories, self.retriever_name)
+        payload = self.index_snapshot.load(source_hash)
+        if payload is not None:
+            self.qa_data = payload['qa_data']
+            self.qa_by_id = {qa.id: qa for qa in self.qa_data}
+            self.qa_index = payload['qa_index']
+            self.retriever = payload['retriever']
+            self._qa_html_cache = {}
+            return
+        
+        started = time.perf_counter()
+        self.qa_data = self.load_qa_data()
+        self._index_qa_data()
+        build_ms = (time.perf_counter() - started) * 1000
+        self.index_snapshot.save(source_hash, {'qa_data': self.qa_data, 'qa_index': self.qa_index,
+                                               'retriever': self.retriever}, build_ms)
+
+    def reload_qa_data_if_changed(self) -> bool:
+        """Reload Q&A data only when qa_data.json or the fallback table changed on disk"""
+        mtime = self._get_qa_mtime()
+        if mtime == self._qa_mtime:
+            return False
+        self._qa_mtime = mtime
+        self._load_knowledge_base()
+        self._load_pregenerated()
+        return True
+
+    @property
+    def assistant_name(self) -> str:
+        return "🧠 Smart Assistant" if self.groq_client else "📋 Concept Assistant"
+
+    def render_qa_message(self, qa_id: int, role: str) -> str:
+        """Chat HTML for a Q&A question/answer, rendered once and shared by all sessions"""
+        key = (qa_id, role)
+        html = self._qa_html_cache.get(key)
+        if html is None:
+            qa = self.qa_by_id.get(qa_id)
+            if qa is None:
+                content = "[Η απάντηση δεν είναι πλέον διαθέσιμη]"
+            else:
+                content = qa.question if role == "user" else qa.answer
+            html = render_message_html(role, content, self.assistant_name)
+            self._qa_html_cache[key] = html
+        return html
+
+    def get_enhanced_fallback_data(self) -> List[QAEntry]:
         """Enhanced fallback data with comprehensive coverage"""
         print("📋 Using enhanced fallback data...")
-        return [
+        return [QAEntry.from_dict(entry) for entry in [
             {
                 "id": 1,
                 "category": "Γενικές Πληροφορίες",
@@ -238,136 +1607,110 @@ class OptimizedInternshipChatbot:
                 "answer": "ΧΡΟΝΙΚΕΣ ΑΠΑΙΤΗΣΕΙΣ:\n\n⏱️ ΣΥΝΟΛΙΚΕΣ ΩΡΕΣ:\n240 ώρες (υποχρεωτικό ελάχιστο)\n\n📅 ΠΡΟΘΕΣΜΙΑ:\nΜέχρι 30 Μαΐου\n\n📆 ΚΑΝΟΝΕΣ ΩΡΑΡΙΟΥ:\n• Δευτέρα έως Σάββατο\n• ΌΧΙ Κυριακές\n• Μέχρι 8 ώρες/ημέρα\n• 5 ημέρες/εβδομάδα\n\n📊 ΠΑΡΑΔΕΙΓΜΑΤΑ ΠΡΟΓΡΑΜΜΑΤΙΣΜΟΥ:\n• 6 εβδομάδες × 40 ώρες\n• 8 εβδομάδες × 30 ώρες\n• 10 εβδομάδες × 24 ώρες\n\nΣΥΜΦΩΝΙΑ: Το ωράριο ορίζεται από τη δομή σε συνεργασία μαζί σας\n\nΠΛΗΡΟΦΟΡΙΕΣ: gsofianidis@mitropolitiko.edu.gr",
                 "keywords": ["ώρες", "ωρες", "240", "ποσες", "πόσες", "ποσα", "ποσά", "συνολικά", "συνολικα", "όλες", "ολες", "τελικά", "τελικα", "χρονοδιάγραμμα", "χρονοδιαγραμμα", "διάρκεια", "διαρκεια", "χρόνος", "χρονος", "30/5", "deadline", "προθεσμία", "προθεσμια"]
             }
-        ]
+        ]]
+
+    def extract_pdf_pages(self, content: bytes) -> List[str]:
+        """Extract the full text of every page of a PDF"""
+        pages = []
+        if PDF_METHOD == "PyPDF2":
+            pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+            for page_num, page in enumerate(pdf_reader.pages):
+                try:
+                    pages.append((page.extract_text() or "").strip())
+                except Exception as e:
+                    print(f"⚠️ Error extracting page {page_num}: {e}")
+                    pages.append("")
+        
+        elif PDF_METHOD == "PyMuPDF":
+            pdf_document = fitz.open(stream=content, filetype="pdf")
+            for page_num in range(pdf_document.page_count):
+                try:
+                    pages.append(pdf_document[page_num].get_text().strip())
+                except Exception as e:
+                    print(f"⚠️ Error extracting page {page_num}: {e}")
+                    pages.append("")
+            pdf_document.close()
+        
+        return pages
 
-    def download_pdf_file(self, filename: str) -> str:
-        """Memory-optimized PDF download and processing"""
+    def download_pdf_file(self, filename: str) -> bool:
+        """Make sure a PDF's full text is in the document store (download once)"""
         if not PDF_AVAILABLE:
             print(f"⚠️ No PDF library available, cannot process {filename}")
-            return ""
+            return False
         
-        # Check cache first
-        if filename in self.pdf_cache:
-            print(f"📋 Using cached content for {filename}")
-            return self.pdf_cache[filename]
+        # Stored documents are served as-is; DocumentSync revalidates them in the background
+        if self.doc_store.has(filename):
+            return True
         
         try:
-            base_url = "https://raw.githubusercontent.com/GiorgosBouh/chatbot.placement/main/"
-            url = base_url + filename
-            
-            print(f"🔍 Downloading {filename} from GitHub using {PDF_METHOD}...")
-            
-            response = requests.get(url, timeout=15)
-            response.raise_for_status()
-            
-            text_content = []
-            
-            if PDF_METHOD == "PyPDF2":
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(response.content))
-                for page_num, page in enumerate(pdf_reader.pages):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text.strip():
-                            # Memory optimization: limit content length
-                            text_content.append(page_text.strip()[:2000])  # Limit per page
-                    except Exception as e:
-                        print(f"⚠️ Error extracting page {page_num}: {e}")
-                
-            elif PDF_METHOD == "PyMuPDF":
-                pdf_document = fitz.open(stream=response.content, filetype="pdf")
-                for page_num in range(min(pdf_document.page_count, 10)):  # Limit pages for memory
-                    try:
-                        page = pdf_document[page_num]
-                        page_text = page.get_text()
-                        if page_text.strip():
-                            text_content.append(page_text.strip()[:2000])  # Limit per page
-                    except Exception as e:
-                        print(f"⚠️ Error extracting page {page_num}: {e}")
-                pdf_document.close()
-            
-            full_text = "\n".join(text_content)
-            
-            # Memory optimization: Cache only essential content
-            if len(full_text) > 5000:
-                full_text = full_text[:5000] + "...\n[Περιεχόμενο περιορίστηκε για βελτιστοποίηση μνήμης]"
-            
-            self.pdf_cache[filename] = full_text
-            
-            print(f"✅ Successfully processed {filename} ({len(full_text)} characters)")
-            return full_text
+            print(f"🔍 Downloading {filename} using {PDF_METHOD}...")
+            self.doc_sync.ensure(filename)
+            print(f"✅ Successfully processed {filename} ({self.doc_store.page_count(filename)} pages)")
+            return True
             
         except Exception as e:
             print(f"❌ Failed to process {filename}: {e}")
-            return ""
+            return False
 
-    def extract_concepts(self, question: str) -> Dict[str, float]:
-        """Enhanced concept extraction with scoring"""
-        question_lower = question.lower()
-        detected_concepts = {}
-        
-        for concept, data in self.concept_patterns.items():
-            matches = sum(1 for keyword in data['keywords'] if keyword in question_lower)
-            if matches > 0:
-                # Calculate concept strength
-                strength = (matches / len(data['keywords'])) * data['weight']
-                detected_concepts[concept] = strength
-        
-        return detected_concepts
+    def extract_concepts(self, question: str, strengths: Optional[np.ndarray] = None) -> Dict[str, float]:
+        """Enhanced concept extraction with scoring (from a precomputed concept vector if given)"""
+        if strengths is None:
+            strengths = self.qa_index.concept_vector(question.lower())
+        return {concept: float(strengths[row])
+                for row, concept in enumerate(self.qa_index.concept_names) if strengths[row] > 0}
 
-    def enhanced_similarity_calculation(self, question: str, qa_entry: Dict) -> float:
-        """Enhanced similarity calculation with concept weighting"""
-        question_lower = question.lower()
-        
-        # Extract concepts
-        question_concepts = self.extract_concepts(question)
-        
-        # Base keyword matching
-        keyword_matches = sum(1 for keyword in qa_entry.get('keywords', []) 
-                            if keyword.lower() in question_lower)
-        keyword_score = keyword_matches / max(len(qa_entry.get('keywords', [])), 1) * 0.4
-        
-        # Title similarity
-        title_words = qa_entry['question'].lower().split()
-        question_words = [w for w in question_lower.split() if len(w) > 2]
-        
-        title_matches = sum(1 for word in title_words if word in question_lower and len(word) > 2)
-        reverse_matches = sum(1 for word in question_words if word in qa_entry['question'].lower())
-        title_score = (title_matches + reverse_matches) / max(len(title_words) + len(question_words), 1) * 0.3
-        
-        # Concept-category matching
-        qa_category = qa_entry.get('category', '').lower()
-        concept_score = 0
-        
-        for concept, strength in question_concepts.items():
-            if concept == 'documents' and ('έγγραφα' in qa_category or 'διαδικασίες' in qa_category):
-                concept_score += strength * 0.3
-            elif concept == 'facilities' and ('δομές' in qa_category or 'φορείς' in qa_category):
-                concept_score += strength * 0.3
-            elif concept == 'time' and ('ώρες' in qa_category or 'χρονοδιάγραμμα' in qa_category):
-                concept_score += strength * 0.3
-            elif concept == 'money' and 'οικονομικά' in qa_category:
-                concept_score += strength * 0.3
-            elif concept == 'contact' and 'επικοινωνία' in qa_category:
-                concept_score += strength * 0.3
-        
-        total_score = keyword_score + title_score + concept_score
-        return min(total_score, 1.0)
-
-    def get_contextual_matches(self, question: str, max_matches: int = 3) -> List[Dict]:
+    def enhanced_similarity_calculation(self, question: str, qa_entry: QAEntry) -> float:
+        """Enhanced similarity calculation with concept weighting (single entry)"""
+        return float(self.qa_index.score_all(question)[self.qa_index.positions[qa_entry.id]])
+
+    def get_contextual_matches(self, question: str, max_matches: int = 3) -> List[QAEntry]:
         """Get contextually relevant Q&A matches"""
         if not self.qa_data:
             return []
         
-        # Calculate similarities
-        scored_matches = []
-        for qa in self.qa_data:
-            similarity = self.enhanced_similarity_calculation(question, qa)
-            if similarity > 0.05:  # Threshold for relevance
-                scored_matches.append((similarity, qa))
-        
-        # Sort and return top matches
-        scored_matches.sort(key=lambda x: x[0], reverse=True)
-        return [qa for score, qa in scored_matches[:max_matches]]
+        # Threshold 0.05 for relevance
+        return [qa for score, qa in self.retriever.retrieve(question, max_matches) if score > 0.05]
+
+    def best_match(self, question: str) -> Tuple[Optional[QAEntry], float]:
+        """Highest-scoring entry and its similarity"""
+        ranked = self.retriever.retrieve(question, 1)
+        if not ranked:
+            return None, 0.0
+        similarity, best = ranked[0]
+        return best, similarity
+
+    def is_follow_up(self, question: str, context: Optional[RetrievalContext]) -> bool:
+        """A short or mostly-pronoun question that stays on the previous topic"""
+        if context is None or not context.qa_ids:
+            return False
+        words = re.findall(r'\w+', question.lower())
+        if not words:
+            return False
+        anaphoric = sum(1 for word in words if word in self.follow_up_words)
+        if anaphoric / len(words) < 0.5 and len(words) > self.follow_up_max_words:
+            return False
+        # Must refer back (pronoun/particle or shared concept) and not open a new topic
+        concepts = self.extract_concepts(question)
+        if not anaphoric and not concepts:
+            return False
+        previous_concepts = self.extract_concepts(context.question)
+        return all(concept in previous_concepts for concept in concepts)
+
+    def rank_candidates(self, question: str, qa_ids: Tuple[int, ...]) -> List[Tuple[float, QAEntry]]:
+        """Score only the given entries against a question, highest first"""
+        scores = self.qa_index.score_all(question)
+        positions = self.qa_index.positions
+        ranked = [(float(scores[positions[qa_id]]), self.qa_by_id[qa_id])
+                  for qa_id in qa_ids if qa_id in positions]
+        return sorted(ranked, key=lambda match: -match[0])
+
+    def retrieve_context(self, question: str) -> Tuple[Dict[str, float], List[QAEntry], str]:
+        """Concepts, Q&A matches and PDF passages for a question (full search)"""
+        concepts = self.extract_concepts(question)
+        qa_matches = self.get_contextual_matches(question)
+        pdf_content = self.search_pdfs_intelligently(question, concepts)
+        return concepts, qa_matches, pdf_content
 
     def search_pdfs_intelligently(self, question: str, concepts: Dict[str, float]) -> str:
         """Intelligent PDF search with concept-based filtering"""
@@ -382,20 +1725,28 @@ class OptimizedInternshipChatbot:
         relevant_content = []
         
         for filename in self.pdf_files:
-            content = self.download_pdf_file(filename)
-            if content:
-                content_lower = content.lower()
+            if self.download_pdf_file(filename):
+                # Scan page by page from the mapped store; keep only matching pages
+                found_words, found_concepts, matching_pages = set(), set(), []
+                for page in self.doc_store.pages(filename):
+                    page_lower = page.lower()
+                    page_words = {word for word in question_words if word in page_lower}
+                    found_words |= page_words
+                    found_concepts.update(concept for concept in concepts
+                                          if concept not in found_concepts
+                                          and self._check_concept_in_pdf(concept, page_lower))
+                    if page_words:
+                        matching_pages.append(page)
                 
                 # Calculate relevance score
-                word_matches = sum(1 for word in question_words if word in content_lower)
-                concept_matches = sum(strength for concept, strength in concepts.items() 
-                                    if self._check_concept_in_pdf(concept, content_lower))
+                word_matches = len(found_words)
+                concept_matches = sum(concepts[concept] for concept in found_concepts)
                 
                 relevance_score = word_matches * 0.4 + concept_matches * 0.6
                 
-                if relevance_score > 0.3:
+                if relevance_score > 0.3 and matching_pages:
                     # Extract relevant sections
-                    sections = self._extract_relevant_sections(content, question_words, max_chars=800)
+                    sections = self._extract_relevant_sections("\n".join(matching_pages), question_words, max_chars=800)
                     if sections:
                         relevant_content.append(f"[Από {filename}]\n{sections}")
                         print(f"✅ Found relevant content in {filename} (score: {relevance_score:.2f})")
@@ -431,21 +1782,38 @@ class OptimizedInternshipChatbot:
         
         return '. '.join(result) + ('.' if result else '')
 
-    def get_smart_ai_response(self, user_message: str) -> Tuple[str, bool]:
-        """Enhanced AI response with intelligent context building"""
+    def get_smart_ai_response(self, user_message: str,
+                              retrieval: Optional[Tuple[Dict[str, float], List[QAEntry], str]] = None,
+                              previous_question: Optional[str] = None,
+                              route: Optional[Dict] = None,
+                              trace: Optional[Dict] = None,
+                              conversation: Optional[str] = None) -> Tuple[str, bool]:
+        """Enhanced AI response with intelligent context building.
+
+        A rendered ConversationMemory, when given, replaces the previous
+        question as the follow-up context. When a trace dict is given, the
+        prompt size and raw LLM response are stored in it.
+        """
         if not self.groq_client:
             return "", False
         
         try:
-            # Extract concepts
-            concepts = self.extract_concepts(user_message)
+            # Concepts, Q&A matches and PDF content (precomputed for follow-ups)
+            concepts, qa_matches, pdf_content = retrieval or self.retrieve_context(user_message)
             print(f"🧠 Detected concepts: {list(concepts.keys())}")
             
-            # Get relevant Q&A matches
-            qa_matches = self.get_contextual_matches(user_message)
+            # Model and output budget for this kind of question
+            if route is None:
+                route = self.model_router.select(user_message, concepts, 0.0)
+            print(f"🚦 Route: {route.get('name', route['model'])} ({route['model']}, max_tokens={route['max_tokens']})")
             
-            # Get relevant PDF content
-            pdf_content = self.search_pdfs_intelligently(user_message, concepts)
+            # Earlier turns (or at least the previous question) give follow-ups their missing context
+            if conversation:
+                follow_up_note = f"{conversation}\n\n"
+            elif previous_question:
+                follow_up_note = f"ΠΡΟΗΓΟΥΜΕΝΗ ΕΡΩΤΗΣΗ ΦΟΙΤΗΤΗ: {previous_question}\n"
+            else:
+                follow_up_note = ""
             
             # Build context
             context_parts = []
@@ -455,7 +1823,7 @@ class OptimizedInternshipChatbot:
             
             if qa_matches:
                 qa_context = "\n\n".join([
-                    f"ΕΡΩΤΗΣΗ: {qa['question']}\nΑΠΑΝΤΗΣΗ: {qa['answer']}"
+                    f"ΕΡΩΤΗΣΗ: {qa.question}\nΑΠΑΝΤΗΣΗ: {qa.answer}"
                     for qa in qa_matches
                 ])
                 context_parts.append(f"ΒΑΣΗ ΓΝΩΣΗΣ:\n{qa_context}")
@@ -467,7 +1835,7 @@ class OptimizedInternshipChatbot:
                 full_prompt = f"""ΔΙΑΘΕΣΙΜΕΣ ΠΛΗΡΟΦΟΡΙΕΣ:
 {combined_context}
 
-ΕΡΩΤΗΣΗ ΦΟΙΤΗΤΗ: {user_message}
+{follow_up_note}ΕΡΩΤΗΣΗ ΦΟΙΤΗΤΗ: {user_message}
 
 ΕΝΤΟΠΙΣΜΕΝΕΣ ΕΝΝΟΙΕΣ: {', '.join(concepts.keys()) if concepts else 'Γενική ερώτηση'}
 
@@ -482,7 +1850,7 @@ class OptimizedInternshipChatbot:
 Απάντησε με δομημένο τρόπο και επαγγελματικό τόνο στα ελληνικά."""
             else:
                 # Fallback prompt with enhanced reasoning
-                full_prompt = f"""ΕΡΩΤΗΣΗ ΦΟΙΤΗΤΗ: {user_message}
+                full_prompt = f"""{follow_up_note}ΕΡΩΤΗΣΗ ΦΟΙΤΗΤΗ: {user_message}
 
 ΠΛΑΙΣΙΟ: Φοιτητής Προπονητικής & Φυσικής Αγωγής, Μητροπολιτικό Κολλέγιο Θεσσαλονίκης
 
@@ -502,26 +1870,47 @@ class OptimizedInternshipChatbot:
 
 Απάντησε με επαγγελματικό τόνο στα ελληνικά."""
 
-            # Call Groq API
-            chat_completion = self.groq_client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": full_prompt}
-                ],
-                model="llama-3.1-8b-instant",
-                temperature=0.2,  # Lower for consistency
-                max_tokens=1000,
-                top_p=0.9,
-                stream=False
-            )
-
-            response = chat_completion.choices[0].message.content
+            # Call Groq API through the gate: identical in-flight questions share one call
+            def call_groq() -> str:
+                call_start = time.perf_counter()
+                chat_completion = self.groq_client.chat.completions.create(
+                    messages=[
+                        {"role": "system", "content": self.system_prompt},
+                        {"role": "user", "content": full_prompt}
+                    ],
+                    model=route['model'],
+                    temperature=0.2,  # Lower for consistency
+                    max_tokens=route['max_tokens'],
+                    top_p=0.9,
+                    stream=False
+                )
+                self.model_router.record(route.get('name', route['model']), (time.perf_counter() - call_start) * 1000)
+                return chat_completion.choices[0].message.content
+
+            context_fingerprint = hashlib.sha1(
+                "\n".join([conversation or previous_question or ""] + context_parts).encode('utf-8')).hexdigest()
+            flight_key = (f"{route['model']}|{route['max_tokens']}|"
+                          f"{normalize_question(user_message)}|{context_fingerprint}")
+            if trace is not None:
+                trace['prompt_chars'] = len(self.system_prompt) + len(full_prompt)
+                trace['conversation_chars'] = len(conversation or "")
+            cached = self.shared_cache.get('llm', flight_key) if self.shared_cache else None
+            if cached is not None:
+                print("💾 Shared cache hit")
+                if trace is not None:
+                    trace['llm_response'] = cached
+                return cached, True
+            response = self.llm_gate.run(flight_key, call_groq)
+            if trace is not None:
+                trace['llm_response'] = response
             
             # Validate Greek characters
             if response and any(ord(char) > 1500 and ord(char) not in range(0x0370, 0x03FF) for char in response):
                 print("⚠️ Detected non-Greek characters in response")
                 return "", False
             
+            if self.shared_cache and response:
+                self.shared_cache.set('llm', flight_key, response, ttl=self.llm_cache_ttl)
             print("✅ Smart AI response generated successfully")
             return response, True
             
@@ -529,128 +1918,165 @@ class OptimizedInternshipChatbot:
             print(f"❌ Smart AI Error: {e}")
             return "", False
 
-    def get_concept_based_fallback(self, question: str) -> str:
-        """Enhanced concept-based smart fallback"""
-        concepts = self.extract_concepts(question)
+    def get_concept_based_fallback(self, question: str,
+                                   strengths: Optional[np.ndarray] = None) -> ConceptFallback:
+        """Concept-based fallback answer (from a precomputed concept vector if given)"""
         question_lower = question.lower()
-        
-        # Prioritize concepts by strength
-        top_concept = max(concepts.items(), key=lambda x: x[1])[0] if concepts else None
-        
-        if top_concept == 'facilities' or any(keyword in question_lower for keyword in ['σύλλογο', 'γυμναστήριο', 'δομή', 'φορέα']):
-            return """ΕΓΚΕΚΡΙΜΕΝΕΣ ΔΟΜΕΣ ΠΡΑΚΤΙΚΗΣ ΑΣΚΗΣΗΣ:
-
-🏃‍♂️ ΑΘΛΗΤΙΚΕΣ ΕΓΚΑΤΑΣΤΑΣΕΙΣ:
-• Αθλητικούς συλλόγους όλων των αθλημάτων
-• Γυμναστήρια και fitness centers
-• Κολυμβητήρια
-• Ακαδημίες αθλητισμού
-• Personal training studios
-• Κέντρα αποκατάστασης
-
-🏛️ ΔΗΜΟΣΙΟΙ ΦΟΡΕΙΣ:
-• Δημόσιους αθλητικούς οργανισμούς
-• Σχολεία με τμήμα φυσικής αγωγής
-
-✅ ΠΡΟΫΠΟΘΕΣΕΙΣ:
-• Νόμιμη λειτουργία και ΑΦΜ
-• Εκπαιδευτής με κατάλληλα προσόντα
-• Δυνατότητα καθοδήγησης
-
-ΕΓΚΡΙΣΗ ΔΟΜΗΣ: gsofianidis@mitropolitiko.edu.gr"""
-
-        elif top_concept == 'documents' or any(keyword in question_lower for keyword in ['έγγραφα', 'χαρτιά', 'διαδικασία']):
-            return """ΑΠΑΙΤΟΥΜΕΝΑ ΕΓΓΡΑΦΑ ΠΡΑΚΤΙΚΗΣ:
-
-📋 ΓΙΑ ΤΟΝ ΦΟΙΤΗΤΗ:
-• Αίτηση πραγματοποίησης πρακτικής άσκησης
-• Στοιχεία φοιτητή (συμπληρωμένη φόρμα)
-• Ασφαλιστική ικανότητα από gov.gr
-• Υπεύθυνη δήλωση (μη λήψη επιδόματος)
-
-🏢 ΓΙΑ ΤΗ ΔΟΜΗ:
-• Στοιχεία φορέα (ΑΦΜ, διεύθυνση, εκπρόσωπος)
-• Ημέρες και ώρες δεκτότητας
-
-⚠️ ΣΗΜΑΝΤΙΚΟ:
-Ξεκινήστε από την ασφαλιστική ικανότητα - χρειάζεται χρόνο!
-
-ΠΗΓΗ: Moodle SE5117
-ΕΠΙΚΟΙΝΩΝΙΑ: gsofianidis@mitropolitiko.edu.gr"""
-
-        elif top_concept == 'time' or any(keyword in question_lower for keyword in ['ώρες', 'χρόνος', 'προθεσμία']):
-            return """ΧΡΟΝΙΚΕΣ ΑΠΑΙΤΗΣΕΙΣ ΠΡΑΚΤΙΚΗΣ:
-
-⏱️ ΣΥΝΟΛΙΚΕΣ ΩΡΕΣ: 240 ώρες (υποχρεωτικό)
-📅 ΠΡΟΘΕΣΜΙΑ: 30 Μαΐου
-
-📆 ΚΑΝΟΝΕΣ ΩΡΑΡΙΟΥ:
-• Δευτέρα-Σάββατο (όχι Κυριακές)
-• Μέχρι 8 ώρες/ημέρα
-• 5 ημέρες/εβδομάδα
-
-📊 ΠΑΡΑΔΕΙΓΜΑΤΑ ΠΡΟΓΡΑΜΜΑΤΙΣΜΟΥ:
-• 6 εβδομάδες × 40 ώρες
-• 8 εβδομάδες × 30 ώρες
-• 10 εβδομάδες × 24 ώρες
-
-ΠΡΟΓΡΑΜΜΑΤΙΣΜΟΣ: gsofianidis@mitropolitiko.edu.gr"""
-
-        elif top_concept == 'contact' or any(keyword in question_lower for keyword in ['επικοινωνία', 'υπεύθυνος']):
-            return """ΣΤΟΙΧΕΙΑ ΕΠΙΚΟΙΝΩΝΙΑΣ:
-
-👨‍🏫 ΚΥΡΙΑ ΕΠΙΚΟΙΝΩΝΙΑ:
-Γεώργιος Σοφιανίδης, MSc, PhD(c)
-📧 gsofianidis@mitropolitiko.edu.gr
-🏷️ Υπεύθυνος Πρακτικής Άσκησης
-
-👨‍💼 ΕΝΑΛΛΑΚΤΙΚΗ ΕΠΙΚΟΙΝΩΝΙΑ:
-Γεώργιος Μπουχουράς, MSc, PhD
-📧 gbouchouras@mitropolitiko.edu.gr
-📞 2314 409000
-🏷️ Programme Leader
-
-📋 ΚΑΤΗΓΟΡΙΟΠΟΙΗΣΗ:
-• Θέματα πρακτικής ➜ Γεώργιος Σοφιανίδης
-• Τεχνικά προβλήματα ➜ Γεώργιος Μπουχουράς"""
-
-        else:
-            return f"""Δεν βρέθηκε συγκεκριμένη απάντηση για αυτή την ερώτηση.
-
-ΠΡΟΤΕΙΝΟΜΕΝΕΣ ΕΝΕΡΓΕΙΕΣ:
-• Διατυπώστε την ερώτηση πιο συγκεκριμένα
-• Επιλέξτε από τις συχνές ερωτήσεις στο μενού
-• Επικοινωνήστε απευθείας με τον υπεύθυνο
-
-ΕΠΙΚΟΙΝΩΝΙΑ:
-📧 gsofianidis@mitropolitiko.edu.gr
-📞 2314 409000
-
-Για άμεση βοήθεια, περιγράψτε τη συγκεκριμένη απορία σας."""
+        if strengths is None:
+            strengths = self.qa_index.concept_vector(question_lower)
+        return self.concept_fallbacks.resolve(strengths, question_lower)
 
     def get_response(self, question: str) -> str:
         """Main response method - optimized for memory efficiency"""
+        return self.get_response_details(question)['answer']
+
+    def get_response_details(self, question: str, context: Optional[RetrievalContext] = None,
+                             memory: Optional[ConversationMemory] = None) -> Dict:
+        """Answer a question and report the path taken with per-stage timings (ms).
+
+        With a conversation memory, follow-ups sent to the LLM see the earlier
+        turns, and the answered turn is added to the memory.
+        """
+        previous = None
+        if self.trace_recorder is not None and context is not None and context.question:
+            previous = {'question': context.question, 'qa_ids': list(context.qa_ids),
+                        'passages': context.passages}
+        details = self._answer_question(question, context, memory)
+        if memory is not None and details['answer']:
+            memory.add_turn(question, details['answer'])
+        if self.trace_recorder is not None:
+            self.trace_recorder.record(self, question, details, previous)
+        if self.shared_cache is not None:
+            self.shared_cache.incr(f"answers.{details['path']}")
+            self.shared_cache.incr(f"answer_ms.{details['path']}", details['timings'].get('total', 0.0))
+        return details
+
+    def _answer_question(self, question: str, context: Optional[RetrievalContext],
+                         memory: Optional[ConversationMemory] = None) -> Dict:
+        """Resolve a question through exact, direct, pregenerated, AI and fallback paths.
+
+        With a per-session context, follow-up questions are answered by
+        re-ranking the previous turn's candidates and reusing its passages.
+        """
+        details = {'answer': "", 'path': None, 'similarity': 0.0, 'qa_id': None,
+                   'follow_up': False, 'timings': {}}
+        timings = details['timings']
+        started = time.perf_counter()
+        
         if not self.qa_data:
-            return "Δεν υπάρχουν διαθέσιμα δεδομένα γνώσης."
+            details.update(answer="Δεν υπάρχουν διαθέσιμα δεδομένα γνώσης.", path='no_data')
+            return details
         
         print(f"\n🤖 Processing question: '{question}'")
         
+        # Step 0: Exact (normalized) question or alias
+        stage_start = time.perf_counter()
+        exact = self.qa_index.lookup(question)
+        if exact is not None:
+            print(f"⚡ Exact question match (id: {exact.id})")
+            if context is not None:
+                context.update(question, [exact.id])
+            timings['matching'] = (time.perf_counter() - stage_start) * 1000
+            details.update(answer=exact.answer, path='exact_match', similarity=1.0, qa_id=exact.id,
+                           candidates=[exact.id])
+            timings['total'] = (time.perf_counter() - started) * 1000
+            return details
+        
         # Step 1: Check for high-similarity direct matches
-        print("📋 Step 1: Checking for direct matches...")
-        best_match = max(self.qa_data, key=lambda x: self.enhanced_similarity_calculation(question, x))
-        similarity = self.enhanced_similarity_calculation(question, best_match)
+        follow_up = self.is_follow_up(question, context)
+        full_ranked = None
+        if follow_up:
+            print(f"🔁 Step 1: Follow-up of '{context.question}', re-ranking previous candidates...")
+            search_question = f"{context.question} {question}"
+            ranked = self.rank_candidates(search_question, context.qa_ids)
+            similarity, best_match = ranked[0] if ranked else (0.0, None)
+            qa_matches = [qa for score, qa in ranked if score > 0.05][:3]
+            # Fall back to the full search when the previous topic doesn't answer it
+            full_ranked = self.retriever.retrieve(question, 3)
+            full_similarity, full_best = full_ranked[0]
+            if similarity <= 0.4 or (full_best.id not in context.qa_ids and full_similarity > similarity):
+                print(f"↩️ Previous candidates don't fit (score: {similarity:.3f}), searching all entries")
+                follow_up = False
+        if not follow_up:
+            print("📋 Step 1: Checking for direct matches...")
+            search_question = question
+            ranked = full_ranked or self.retriever.retrieve(question, 3)
+            similarity, best_match = ranked[0]
+            if similarity <= 0.4:
+                # Weak match: retry with Greeklish transliterated and typos corrected
+                rewritten = self.qa_index.rewrite(question)
+                if rewritten and rewritten != ' '.join(re.findall(r'\w+', question.lower())):
+                    exact = self.qa_index.lookup(rewritten)
+                    if exact is not None:
+                        print(f"🔤 Rewritten to '{rewritten}', exact match (id: {exact.id})")
+                        if context is not None:
+                            context.update(question, [exact.id])
+                        timings['matching'] = (time.perf_counter() - stage_start) * 1000
+                        details.update(answer=exact.answer, path='exact_match', similarity=1.0,
+                                       qa_id=exact.id, rewritten=rewritten, candidates=[exact.id])
+                        timings['total'] = (time.perf_counter() - started) * 1000
+                        return details
+                    rewritten_ranked = self.retriever.retrieve(rewritten, 3)
+                    if rewritten_ranked[0][0] > similarity:
+                        print(f"🔤 Rewritten to '{rewritten}' (score: {similarity:.3f} → {rewritten_ranked[0][0]:.3f})")
+                        search_question, ranked = rewritten, rewritten_ranked
+                        similarity, best_match = ranked[0]
+                        details['rewritten'] = rewritten
+            qa_matches = [qa for score, qa in ranked if score > 0.05]
+            if context is not None:
+                context.update(question, [qa.id for qa in qa_matches])
+        timings['matching'] = (time.perf_counter() - stage_start) * 1000
+        details.update(similarity=similarity, follow_up=follow_up, candidates=[qa.id for qa in qa_matches])
         
-        if similarity > 0.4:  # High confidence threshold
+        if best_match is not None and similarity > 0.4:  # High confidence threshold
             print(f"✅ High similarity match found (score: {similarity:.3f})")
-            return best_match['answer']
+            details.update(answer=best_match.answer, path='followup_match' if follow_up else 'direct_match',
+                           qa_id=best_match.id)
+            timings['total'] = (time.perf_counter() - started) * 1000
+            return details
+        
+        # Step 1b: Answer generated offline for an anticipated question
+        if self.pregenerated is not None and not follow_up:
+            pregenerated = self.pregenerated.lookup(question, details.get('rewritten'))
+            if pregenerated is not None:
+                print("📦 Pregenerated answer found")
+                details.update(answer=pregenerated['answer'], path='pregenerated')
+                timings['total'] = (time.perf_counter() - started) * 1000
+                return details
         
         # Step 2: Enhanced AI processing with context
         print("🧠 Step 2: Enhanced AI processing...")
+        strengths = None
         if self.groq_client:
-            response, success = self.get_smart_ai_response(question)
+            stage_start = time.perf_counter()
+            strengths = self.qa_index.concept_vector(search_question.lower())
+            concepts = self.extract_concepts(search_question, strengths)
+            if follow_up and context.passages is not None:
+                pdf_content = context.passages
+            else:
+                pdf_content = self.search_pdfs_intelligently(search_question, concepts)
+                if context is not None:
+                    context.passages = pdf_content
+            timings['retrieval'] = (time.perf_counter() - stage_start) * 1000
+            details.update(concepts=concepts, passages=pdf_content)
+            
+            route = self.model_router.select(question, concepts, similarity)
+            details.update(route=route.get('name', route['model']), model=route['model'])
+            
+            # Only follow-ups carry the conversation; standalone questions stay cacheable
+            conversation = memory.render() if follow_up and memory is not None else None
+            
+            stage_start = time.perf_counter()
+            response, success = self.get_smart_ai_response(
+                question, (concepts, qa_matches, pdf_content),
+                previous_question=context.question if follow_up else None, route=route, trace=details,
+                conversation=conversation)
+            timings['ai'] = (time.perf_counter() - stage_start) * 1000
             if success and response.strip():
                 print("✅ Smart AI response successful")
-                return response
+                details.update(answer=response, path='smart_ai')
+                timings['total'] = (time.perf_counter() - started) * 1000
+                return details
             else:
                 print("⚠️ AI processing failed")
         else:
@@ -658,12 +2084,346 @@ class OptimizedInternshipChatbot:
         
         # Step 3: Concept-based intelligent fallback
         print("📋 Step 3: Using intelligent fallback...")
-        if similarity > 0.15:  # Medium confidence
+        stage_start = time.perf_counter()
+        if best_match is not None and similarity > 0.15:  # Medium confidence
             print(f"🟡 Medium similarity fallback (score: {similarity:.3f})")
-            return best_match['answer']
+            details.update(answer=best_match.answer, path='medium_match', qa_id=best_match.id)
         else:
             print("🔄 Using concept-based smart fallback")
-            return self.get_concept_based_fallback(question)
+            fallback = self.get_concept_based_fallback(search_question, strengths)
+            details.update(answer=fallback.answer, path='concept_fallback', fallback_id=fallback.id)
+        timings['fallback'] = (time.perf_counter() - stage_start) * 1000
+        timings['total'] = (time.perf_counter() - started) * 1000
+        return details
+
+# Chat history rendering: only the most recent turns are drawn on each rerun
+CHAT_WINDOW_TURNS = 10
+
+def get_setting(name: str, default):
+    """Read a setting from Streamlit secrets or the environment, typed like default"""
+    value = None
+    try:
+        value = st.secrets.get(name)
+    except Exception:
+        pass
+    if value is None:
+        value = os.environ.get(name)
+    if value is None:
+        return default
+    if isinstance(default, bool) and isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    try:
+        return type(default)(value)
+    except (TypeError, ValueError):
+        print(f"⚠️ Invalid value for {name}: {value!r}, using {default!r}")
+        return default
+
+def deep_getsizeof(obj, seen: Optional[set] = None) -> int:
+    """Approximate heap size of an object graph in bytes"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_getsizeof(k, seen) + deep_getsizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_getsizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(deep_getsizeof(getattr(obj, slot), seen)
+                    for slot in obj.__slots__ if hasattr(obj, slot))
+    elif hasattr(obj, '__dict__'):
+        size += deep_getsizeof(vars(obj), seen)
+    return size
+
+def render_message_html(role: str, content: str, assistant_name: str) -> str:
+    """Render a chat message to HTML once, at append time"""
+    if role == "user":
+        return f'<div class="user-message"><strong>Εσείς:</strong> {content}</div>'
+    content = content.replace('\n', '<br>')
+    return f'<div class="ai-message"><strong>{assistant_name}:</strong><br><br>{content}</div>'
+
+class ChatMessage:
+    """Compact chat message: knowledge-base messages keep only their Q&A id"""
+    __slots__ = ('role', 'content', 'html', 'qa_id')
+
+    def __init__(self, role: str, content: Optional[str] = None,
+                 html: Optional[str] = None, qa_id: Optional[int] = None):
+        self.role = role
+        self.content = content
+        self.html = html
+        self.qa_id = qa_id
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.content) + sys.getsizeof(self.html)
+
+    def get_html(self, chatbot: 'OptimizedInternshipChatbot') -> str:
+        if self.qa_id is not None:
+            return chatbot.render_qa_message(self.qa_id, self.role)
+        return self.html
+
+    def get_content(self, chatbot: 'OptimizedInternshipChatbot') -> str:
+        if self.qa_id is not None:
+            qa = chatbot.qa_by_id.get(self.qa_id)
+            if qa is None:
+                return ""
+            return qa.question if self.role == "user" else qa.answer
+        return self.content
+
+class ConversationHistory:
+    """Per-session chat history capped by message count and bytes"""
+
+    def __init__(self, max_messages: int, max_bytes: int):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.messages: List[ChatMessage] = []
+        self.nbytes = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def append(self, message: ChatMessage):
+        self.messages.append(message)
+        self.nbytes += message.nbytes()
+        # Drop oldest messages beyond the caps (always keep the latest one)
+        while len(self.messages) > 1 and (len(self.messages) > self.max_messages or self.nbytes > self.max_bytes):
+            self.nbytes -= self.messages.pop(0).nbytes()
+            self.dropped += 1
+
+    def clear(self):
+        self.messages = []
+        self.nbytes = 0
+        self.dropped = 0
+
+class SessionRecord:
+    """Per-session state owned by the process-wide registry"""
+    __slots__ = ('history', 'retrieval', 'memory', 'created', 'last_seen')
+
+    def __init__(self, history: ConversationHistory, memory: ConversationMemory):
+        self.history = history
+        self.retrieval = RetrievalContext()
+        self.memory = memory
+        self.created = time.time()
+        self.last_seen = self.created
+
+class SessionRegistry:
+    """Process-wide owner of session histories, with idle-session eviction"""
+
+    def __init__(self, max_messages: int, max_bytes: int, idle_seconds: int,
+                 memory_options: Optional[Dict[str, int]] = None):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.memory_options = memory_options or {}
+        self.sessions: Dict[str, SessionRecord] = {}
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def touch(self, session_id: str) -> Tuple[SessionRecord, bool]:
+        """Return the session's record (creating it if needed) and mark it active"""
+        with self._lock:
+            record = self.sessions.get(session_id)
+            created = record is None
+            if created:
+                record = SessionRecord(ConversationHistory(self.max_messages, self.max_bytes),
+                                       ConversationMemory(**self.memory_options))
+                self.sessions[session_id] = record
+            record.last_seen = time.time()
+            return record, created
+
+    def evict_idle(self) -> int:
+        """Drop sessions idle for longer than idle_seconds"""
+        cutoff = time.time() - self.idle_seconds
+        with self._lock:
+            idle = [sid for sid, record in self.sessions.items() if record.last_seen < cutoff]
+            for sid in idle:
+                del self.sessions[sid]
+            self.evicted += len(idle)
+        if idle:
+            print(f"🧹 Evicted {len(idle)} idle sessions")
+        return len(idle)
+
+    def history_nbytes(self) -> int:
+        """Message bytes held by all sessions, from the histories' running totals"""
+        with self._lock:
+            return sum(record.history.nbytes for record in self.sessions.values())
+
+    def memory_report(self) -> List[Dict[str, Any]]:
+        """Memory held by each session, largest first (walks every session; compute on demand)"""
+        now = time.time()
+        with self._lock:
+            items = list(self.sessions.items())
+        report = [{
+            'session': sid[:8],
+            'messages': len(record.history),
+            'dropped': record.history.dropped,
+            'bytes': deep_getsizeof(record),
+            'idle_s': int(now - record.last_seen),
+        } for sid, record in items]
+        report.sort(key=lambda row: row['bytes'], reverse=True)
+        return report
+
+class MemoryProfiler:
+    """Opt-in tracemalloc accounting: top allocation sites, libraries and snapshot diffs"""
+
+    IGNORED = (tracemalloc.__file__, "<frozen importlib._bootstrap>",
+               "<frozen importlib._bootstrap_external>", "<unknown>")
+
+    def __init__(self, top: int = 15):
+        self.top = top
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.started = time.time()
+        self.previous: Optional[tracemalloc.Snapshot] = None
+        self.previous_taken: Optional[float] = None
+        self._lock = threading.Lock()
+        paths = sysconfig.get_paths()
+        self._roots = sorted({
+            (os.path.dirname(os.path.abspath(__file__)), 'app'),
+            (paths['purelib'], 'site'),
+            (paths['platlib'], 'site'),
+            (paths['stdlib'], 'stdlib'),
+        }, key=lambda root: len(root[0]), reverse=True)
+
+    def snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, pattern) for pattern in self.IGNORED])
+
+    def _locate(self, filename: str) -> Tuple[str, str]:
+        """(kind, path relative to its root) for a traced source file"""
+        for root, kind in self._roots:
+            if filename.startswith(root + os.sep):
+                relative = filename[len(root) + 1:]
+                if kind == 'stdlib' and relative.startswith('site-packages' + os.sep):
+                    continue
+                return kind, relative
+        return 'other', filename
+
+    def library(self, filename: str) -> str:
+        """Package (site-packages), module (stdlib) or file (app) owning a source file"""
+        kind, relative = self._locate(filename)
+        if kind in ('app', 'other'):
+            return relative
+        name = relative.split(os.sep, 1)[0]
+        name = name[:-3] if name.endswith('.py') else name
+        return name if kind == 'site' else f"stdlib:{name}"
+
+    def _site(self, frame) -> str:
+        return f"{self._locate(frame.filename)[1]}:{frame.lineno}"
+
+    def top_sites(self, snapshot: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+        return [{
+            'site': self._site(stat.traceback[0]),
+            'kb': round(stat.size / 1024, 1),
+            'blocks': stat.count,
+        } for stat in snapshot.statistics('lineno')[:self.top]]
+
+    def by_library(self, snapshot: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+        totals: Dict[str, List[int]] = {}
+        for stat in snapshot.statistics('filename'):
+            total = totals.setdefault(self.library(stat.traceback[0].filename), [0, 0])
+            total[0] += stat.size
+            total[1] += stat.count
+        rows = [{'library': name, 'kb': round(size / 1024, 1), 'blocks': count}
+                for name, (size, count) in totals.items()]
+        rows.sort(key=lambda row: row['kb'], reverse=True)
+        return rows[:self.top]
+
+    def diff(self) -> Tuple[tracemalloc.Snapshot, List[Dict[str, Any]]]:
+        """Take a snapshot and compare it with the previous one (empty on the first call)"""
+        with self._lock:
+            snapshot = self.snapshot()
+            rows = []
+            if self.previous is not None:
+                rows = [{
+                    'site': self._site(stat.traceback[0]),
+                    'diff_kb': round(stat.size_diff / 1024, 1),
+                    'kb': round(stat.size / 1024, 1),
+                    'blocks_diff': stat.count_diff,
+                } for stat in snapshot.compare_to(self.previous, 'lineno')[:self.top] if stat.size_diff]
+            self.previous, self.previous_taken = snapshot, time.time()
+        return snapshot, rows
+
+def memory_breakdown(chatbot: 'OptimizedInternshipChatbot', registry: SessionRegistry) -> List[Dict[str, Any]]:
+    """Heap bytes held by the shared components, without double counting shared objects"""
+    seen: set = set()
+    components = [
+        ('qa_data', chatbot.qa_data),
+        ('indexes', (chatbot.qa_by_id, chatbot.qa_index, chatbot.retriever)),
+        ('rendered answers', (chatbot._qa_html_cache, chatbot.concept_fallbacks)),
+        ('doc_store (offsets)', chatbot.doc_store.documents),
+        ('sessions', registry.sessions),
+    ]
+    rows = [{'component': name, 'kb': round(deep_getsizeof(obj, seen) / 1024, 1)} for name, obj in components]
+    rows.append({'component': 'doc_store (memory-mapped)', 'kb': round(chatbot.doc_store.nbytes() / 1024, 1)})
+    return rows
+
+def open_shared_cache(directory: str) -> Optional[SharedCache]:
+    """Cache shared by the app processes on this host (SHARED_CACHE_PATH, empty disables)"""
+    path = get_setting("SHARED_CACHE_PATH", os.path.join(directory, "shared_cache.sqlite3"))
+    if not path:
+        return None
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    except OSError as e:
+        print(f"⚠️ Shared cache disabled: {e}")
+        return None
+    return SharedCache(path, lru_size=get_setting("SHARED_CACHE_LRU", 512))
+
+@st.cache_resource
+def get_chatbot(groq_api_key: Optional[str]) -> 'OptimizedInternshipChatbot':
+    """One chatbot (Q&A data, PDF cache) shared by all sessions of the process"""
+    doc_store_dir = get_setting("DOC_STORE_DIR", ".doc_store")
+    trace_path = get_setting("TRACE_PATH", "")
+    chatbot = OptimizedInternshipChatbot(
+        groq_api_key,
+        retriever=get_setting("RETRIEVER_ENGINE", "heuristic"),
+        doc_store_dir=doc_store_dir,
+        doc_base_url=get_setting("DOC_BASE_URL", "https://raw.githubusercontent.com/GiorgosBouh/chatbot.placement/main/"),
+        doc_revalidate_seconds=get_setting("DOC_REVALIDATE_SECONDS", 3600),
+        model_router=ModelRouter.from_json(get_setting("MODEL_ROUTES", "")),
+        llm_max_concurrency=get_setting("LLM_MAX_CONCURRENCY", 4),
+        use_index_snapshot=get_setting("INDEX_SNAPSHOT", True),
+        pregenerated_path=get_setting("PREGENERATED_ANSWERS", "pregenerated_answers.json") or None,
+        shared_cache=open_shared_cache(doc_store_dir),
+        llm_cache_ttl=get_setting("LLM_CACHE_TTL_SECONDS", 86400),
+        trace_recorder=TraceRecorder(trace_path) if trace_path else None,
+    )
+    chatbot.doc_sync.start()
+    return chatbot
+
+@st.cache_resource
+def get_memory_profiler() -> MemoryProfiler:
+    """Started before the chatbot loads so its allocations are traced"""
+    return MemoryProfiler(top=get_setting("MEMORY_TOP_SITES", 15))
+
+@st.cache_resource
+def get_session_registry() -> SessionRegistry:
+    return SessionRegistry(
+        max_messages=get_setting("MAX_HISTORY_MESSAGES", 60),
+        max_bytes=get_setting("MAX_HISTORY_BYTES", 256 * 1024),
+        idle_seconds=get_setting("SESSION_IDLE_SECONDS", 1800),
+        memory_options={
+            'recent_turns': get_setting("MEMORY_RECENT_TURNS", 2),
+            'recent_tokens': get_setting("MEMORY_RECENT_TOKENS", 500),
+            'summary_tokens': get_setting("MEMORY_SUMMARY_TOKENS", 250),
+        },
+    )
+
+def append_message(chatbot: 'OptimizedInternshipChatbot', history: ConversationHistory,
+                   role: str, content: str, qa_id: Optional[int] = None,
+                   fallback_id: Optional[str] = None):
+    """Append a message; knowledge-base text is stored by Q&A id, other text pre-rendered"""
+    if qa_id is not None and qa_id in chatbot.qa_by_id:
+        history.append(ChatMessage(role, qa_id=qa_id))
+    elif fallback_id is not None and fallback_id in chatbot.concept_fallbacks.by_id:
+        # Shares the fallback's text and HTML rendered at load time
+        fallback = chatbot.concept_fallbacks.by_id[fallback_id]
+        history.append(ChatMessage(role, fallback.answer, fallback.html))
+    else:
+        history.append(ChatMessage(role, content, render_message_html(role, content, chatbot.assistant_name)))
 
 def main():
     """Main Streamlit application - Optimized for Community Cloud"""
@@ -950,27 +2710,33 @@ def main():
     </div>
     """, unsafe_allow_html=True)
 
-    # Initialize session state
-    if 'messages' not in st.session_state:
-        st.session_state.messages = []
-
-    if 'chatbot' not in st.session_state:
-        # Get Groq API key
-        groq_api_key = None
-        try:
-            groq_api_key = st.secrets.get("GROQ_API_KEY") or os.environ.get("GROQ_API_KEY")
-        except:
-            pass
-        
-        st.session_state.chatbot = OptimizedInternshipChatbot(groq_api_key)
-    else:
-        # Refresh data if needed
-        current_data_count = len(st.session_state.chatbot.qa_data)
-        st.session_state.chatbot.qa_data = st.session_state.chatbot.load_qa_data()
-        new_data_count = len(st.session_state.chatbot.qa_data)
-        
-        if new_data_count != current_data_count:
-            st.toast(f"📊 Data updated: {new_data_count} entries")
+    # Get Groq API key
+    groq_api_key = None
+    try:
+        groq_api_key = st.secrets.get("GROQ_API_KEY") or os.environ.get("GROQ_API_KEY")
+    except:
+        groq_api_key = os.environ.get("GROQ_API_KEY")
+    
+    # Opt-in memory diagnostics; tracing starts before the chatbot loads
+    profiler = get_memory_profiler() if get_setting("MEMORY_DIAGNOSTICS", False) else None
+    
+    # Shared chatbot; refresh data if the knowledge base changed on disk
+    chatbot = get_chatbot(groq_api_key)
+    if chatbot.reload_qa_data_if_changed():
+        st.toast(f"📊 Data updated: {len(chatbot.qa_data)} entries")
+
+    # Per-session history lives in the process-wide registry (bounded, evictable)
+    registry = get_session_registry()
+    registry.evict_idle()
+    session_known = 'session_id' in st.session_state
+    if not session_known:
+        st.session_state.session_id = uuid.uuid4().hex
+    if 'chat_window' not in st.session_state:
+        st.session_state.chat_window = CHAT_WINDOW_TURNS
+    session, session_created = registry.touch(st.session_state.session_id)
+    history = session.history
+    if session_known and session_created:
+        st.toast("⏳ Η προηγούμενη συνομιλία έληξε λόγω αδράνειας")
 
     # Quick info cards
     st.markdown("### 📊 Σημαντικές Πληροφορίες")
@@ -1005,13 +2771,13 @@ def main():
         """, unsafe_allow_html=True)
 
     # Optimized Status Indicator
-    if st.session_state.chatbot.groq_client:
+    if chatbot.groq_client:
         st.markdown('<div class="api-status optimized-status">🧠 Smart Mode (Optimized)</div>', unsafe_allow_html=True)
     else:
         st.markdown('<div class="api-status" style="background: #ffc107; color: #000;">📋 Concept Mode</div>', unsafe_allow_html=True)
 
     # Enhanced status information
-    if st.session_state.chatbot.groq_client:
+    if chatbot.groq_client:
         status_text = "Smart Matching → Enhanced AI → Concept Fallback"
     else:
         status_text = "Smart Matching → Concept-Based Responses"
@@ -1046,8 +2812,8 @@ def main():
         st.markdown("## 🔄 Συχνές Ερωτήσεις")
         
         categories = {}
-        for qa in st.session_state.chatbot.qa_data:
-            cat = qa.get('category', 'Άλλα')
+        for qa in chatbot.qa_data:
+            cat = qa.category or 'Άλλα'
             if cat not in categories:
                 categories[cat] = []
             categories[cat].append(qa)
@@ -1055,15 +2821,17 @@ def main():
         for category, questions in categories.items():
             with st.expander(f"📂 {category}"):
                 for qa in questions:
-                    if st.button(qa['question'], key=f"faq_{qa['id']}", use_container_width=True):
-                        st.session_state.messages.append({"role": "user", "content": qa['question']})
-                        st.session_state.messages.append({"role": "assistant", "content": qa['answer']})
+                    if st.button(qa.question, key=f"faq_{qa.id}", use_container_width=True):
+                        session.retrieval.update(qa.question, [qa.id])
+                        session.memory.add_turn(qa.question, qa.answer)
+                        append_message(chatbot, history, "user", qa.question, qa_id=qa.id)
+                        append_message(chatbot, history, "assistant", qa.answer, qa_id=qa.id)
                         st.rerun()
 
         st.markdown("---")
 
         # System Status
-        if st.session_state.chatbot.groq_client:
+        if chatbot.groq_client:
             st.success("🧠 Smart AI Mode Active")
             st.info("Enhanced concept analysis + AI reasoning")
         else:
@@ -1079,7 +2847,10 @@ def main():
         st.markdown("---")
 
         if st.button("🗑️ Νέα Συνομιλία", use_container_width=True):
-            st.session_state.messages = []
+            history.clear()
+            session.retrieval.clear()
+            session.memory.clear()
+            st.session_state.chat_window = CHAT_WINDOW_TURNS
             st.rerun()
 
         # Technical Information
@@ -1092,21 +2863,89 @@ def main():
             st.write("• Enhanced Concept Analysis: Active ✅")
             st.write("• Smart Similarity Matching: Active ✅")
             st.write("• Groq Available:", GROQ_AVAILABLE)
-            st.write("• Groq Client:", st.session_state.chatbot.groq_client is not None)
+            st.write("• Groq Client:", chatbot.groq_client is not None)
+            st.write("• Retriever Engine:", chatbot.retriever_name)
+            gate = chatbot.llm_gate
+            st.write(f"• LLM Gate: {gate.stats['calls']} calls, {gate.stats['coalesced']} coalesced, "
+                     f"{gate.in_flight} in flight (limit {gate.max_concurrent})")
+            route_report = chatbot.model_router.report()
+            if route_report:
+                st.write("**Model Routes (latency):**")
+                st.table(route_report)
             st.write("• PDF Available:", PDF_AVAILABLE)
             st.write("• RAG Libraries:", RAG_AVAILABLE, "(Not used for memory optimization)")
             
             st.write("**Data Sources:**")
-            st.write("• QA Data Count:", len(st.session_state.chatbot.qa_data))
-            st.write("• PDF Files:", len(st.session_state.chatbot.pdf_files))
-            cached_pdfs = len(st.session_state.chatbot.pdf_cache)
-            st.write(f"• Cached PDFs: {cached_pdfs}/{len(st.session_state.chatbot.pdf_files)}")
+            st.write("• QA Data Count:", len(chatbot.qa_data))
+            st.write("• PDF Files:", len(chatbot.pdf_files))
+            cached_pdfs = len(chatbot.doc_store)
+            st.write(f"• Cached PDFs: {cached_pdfs}/{len(chatbot.pdf_files)} "
+                     f"({chatbot.doc_store.nbytes() // 1024} KB memory-mapped)")
+            if chatbot.trace_recorder is not None:
+                st.write(f"• Trace Recording: {chatbot.trace_recorder.recorded} requests → {chatbot.trace_recorder.path}")
+            if chatbot.shared_cache is not None:
+                cache_stats = ", ".join(f"{key}: {value}" for key, value in chatbot.shared_cache.stats.items())
+                st.write(f"• Shared Cache: {cache_stats}")
+                # Expanders run even when collapsed, so the SQLite query waits for a click
+                if st.button("📊 Answers by path", key="shared_metrics"):
+                    shared_metrics = chatbot.shared_cache.metrics()
+                    answer_counts = {name.split('.', 1)[1]: int(value) for name, value in shared_metrics.items()
+                                     if name.startswith('answers.')}
+                    st.write("**Answers by path (all processes):**")
+                    if answer_counts:
+                        st.table([{'path': path, 'answers': count,
+                                   'mean_ms': round(shared_metrics.get(f"answer_ms.{path}", 0.0) / count, 1)}
+                                  for path, count in answer_counts.items()])
+                    else:
+                        st.write("• No answers recorded yet")
+            if chatbot.pregenerated is not None:
+                st.write(f"• Pregenerated Answers: {chatbot.pregenerated.status}, "
+                         f"{len(chatbot.pregenerated.answers)} approved, {chatbot.pregenerated.pending} awaiting review, "
+                         f"{chatbot.pregenerated.hits} served")
+            snapshot = chatbot.index_snapshot
+            if snapshot.status == 'loaded':
+                st.write(f"• Index Snapshot: loaded in {snapshot.load_ms:.1f}ms "
+                         f"(saved {snapshot.saved_ms:.1f}ms of {snapshot.build_ms:.1f}ms rebuild)")
+            else:
+                st.write(f"• Index Snapshot: {snapshot.status} (built in {snapshot.build_ms:.1f}ms)")
+            sync_stats = ", ".join(f"{key}: {value}" for key, value in chatbot.doc_sync.stats.items())
+            st.write(f"• PDF Sync (every {chatbot.doc_sync.interval}s): {sync_stats}")
+            
+            st.write("**Session Memory:**")
+            st.write(f"• Limits: {registry.max_messages} messages / {registry.max_bytes // 1024} KB per session, "
+                     f"idle timeout {registry.idle_seconds}s")
+            st.write(f"• Active sessions: {len(registry.sessions)} (evicted: {registry.evicted}), "
+                     f"{registry.history_nbytes() // 1024} KB of messages")
+            if st.button("📊 Per-session memory", key="session_memory"):
+                session_report = registry.memory_report()
+                if session_report:
+                    st.table(session_report)
+
+            if profiler is not None:
+                st.write("**Memory Diagnostics (tracemalloc):**")
+                traced, peak = tracemalloc.get_traced_memory()
+                st.write(f"• Traced: {traced // 1024} KB (peak {peak // 1024} KB), "
+                         f"{len(sys.modules)} modules imported")
+                if st.button("📸 Snapshot & Diff", key="memory_snapshot"):
+                    since = profiler.previous_taken
+                    snapshot, diff_rows = profiler.diff()
+                    st.write("**Components:**")
+                    st.table(memory_breakdown(chatbot, registry))
+                    st.write("**Libraries:**")
+                    st.table(profiler.by_library(snapshot))
+                    st.write("**Top allocation sites:**")
+                    st.table(profiler.top_sites(snapshot))
+                    if since is None:
+                        st.write("• First snapshot stored; take another to see what changed")
+                    else:
+                        st.write(f"**Changes since previous snapshot ({int(time.time() - since)}s ago):**")
+                        st.table(diff_rows)
             
             # Concept analysis test
             st.subheader("🧠 Concept Analysis Test")
             test_question = st.text_input("Test concept detection:", placeholder="Τι έγγραφα χρειάζομαι;")
             if test_question:
-                concepts = st.session_state.chatbot.extract_concepts(test_question)
+                concepts = chatbot.extract_concepts(test_question)
                 if concepts:
                     st.write("**Detected Concepts:**")
                     for concept, strength in concepts.items():
@@ -1115,10 +2954,8 @@ def main():
                     st.write("No specific concepts detected")
                 
                 # Test similarity
-                if st.session_state.chatbot.qa_data:
-                    best_match = max(st.session_state.chatbot.qa_data, 
-                                   key=lambda x: st.session_state.chatbot.enhanced_similarity_calculation(test_question, x))
-                    similarity = st.session_state.chatbot.enhanced_similarity_calculation(test_question, best_match)
+                if chatbot.qa_data:
+                    best_match, similarity = chatbot.best_match(test_question)
                     st.write(f"**Best match similarity:** {similarity:.3f}")
                     st.write(f"**Would use:** {'Direct match' if similarity > 0.4 else 'AI enhancement' if similarity > 0.15 else 'Concept fallback'}")
 
@@ -1126,14 +2963,19 @@ def main():
     st.markdown('<div class="chat-container">', unsafe_allow_html=True)
     st.markdown("### 💬 Κάντε την ερώτησή σας")
 
-    # Display chat messages
-    for message in st.session_state.messages:
-        if message["role"] == "user":
-            st.markdown(f'<div class="user-message"><strong>Εσείς:</strong> {message["content"]}</div>', unsafe_allow_html=True)
-        else:
-            content = message["content"].replace('\n', '<br>')
-            assistant_name = "🧠 Smart Assistant" if st.session_state.chatbot.groq_client else "📋 Concept Assistant"
-            st.markdown(f'<div class="ai-message"><strong>{assistant_name}:</strong><br><br>{content}</div>', unsafe_allow_html=True)
+    # Display chat messages (windowed: only the most recent turns)
+    messages = history.messages
+    visible_count = st.session_state.chat_window * 2  # user + assistant per turn
+    hidden_count = max(len(messages) - visible_count, 0)
+    
+    if hidden_count:
+        if st.button(f"⬆️ Προηγούμενα μηνύματα ({hidden_count})", key="load_earlier"):
+            st.session_state.chat_window += CHAT_WINDOW_TURNS
+            st.rerun()
+    
+    if messages:
+        chat_html = "".join(message.get_html(chatbot) for message in messages[hidden_count:])
+        st.markdown(chat_html, unsafe_allow_html=True)
 
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -1141,22 +2983,23 @@ def main():
     user_input = st.chat_input("Γράψτε την ερώτησή σας εδώ...")
     
     if user_input:
-        st.session_state.messages.append({"role": "user", "content": user_input})
+        append_message(chatbot, history, "user", user_input)
         
-        spinner_text = "Αναλύω με έξυπνους αλγορίθμους..." if st.session_state.chatbot.groq_client else "Αναλύω με έννοιες..."
+        spinner_text = "Αναλύω με έξυπνους αλγορίθμους..." if chatbot.groq_client else "Αναλύω με έννοιες..."
         
         with st.spinner(spinner_text):
             try:
-                response = st.session_state.chatbot.get_response(user_input)
+                details = chatbot.get_response_details(user_input, session.retrieval, session.memory)
+                response, qa_id, fallback_id = details['answer'], details['qa_id'], details.get('fallback_id')
             except Exception as e:
-                response = f"Συγγνώμη, παρουσιάστηκε σφάλμα: {str(e)}"
+                response, qa_id, fallback_id = f"Συγγνώμη, παρουσιάστηκε σφάλμα: {str(e)}", None, None
                 st.error(f"Error: {e}")
         
-        st.session_state.messages.append({"role": "assistant", "content": response})
+        append_message(chatbot, history, "assistant", response, qa_id=qa_id, fallback_id=fallback_id)
         st.rerun()
 
     # Footer
-    footer_text = "Memory-Optimized Smart Assistant" if st.session_state.chatbot.groq_client else "Enhanced Concept-Based Assistant"
+    footer_text = "Memory-Optimized Smart Assistant" if chatbot.groq_client else "Enhanced Concept-Based Assistant"
     st.markdown(f"""
     <div style="text-align: center; color: #6c757d; padding: 1rem; font-size: 0.9rem;">
         <small>
@@ -0,0 +1,125 @@
+"""Batch question answering over a JSONL file.
+
+Each input line is a JSON object holding a question (field ``question`` by
+default) or a plain JSON string. Questions are answered in parallel through
+the same retrieval + LLM pipeline used by the Streamlit app, with a bounded
+number of concurrent Groq calls. Results are streamed to the output as JSONL
+as soon as each item finishes, so large batches never need to fit in memory.
+
+Usage:
+    python batch_answer.py questions.jsonl -o answers.jsonl --workers 8 --max-llm-calls 2
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, Optional, Tuple
+
+
+def iter_questions(stream, field: str, id_field: str) -> Iterator[Tuple[int, Optional[object], str]]:
+    """Yield (line number, item id, question) lazily from a JSONL stream"""
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"⚠️ Skipping line {line_no}: invalid JSON ({e})", file=sys.stderr)
+            continue
+
+        if isinstance(item, str):
+            yield line_no, None, item
+        elif isinstance(item, dict) and isinstance(item.get(field), str):
+            yield line_no, item.get(id_field), item[field]
+        else:
+            print(f"⚠️ Skipping line {line_no}: no '{field}' field", file=sys.stderr)
+
+
+def answer_one(chatbot, line_no: int, item_id, question: str) -> Dict:
+    """Answer a single question and build its output record"""
+    started = time.perf_counter()
+    record = {'line': line_no, 'id': item_id, 'question': question}
+    try:
+        details = chatbot.get_response_details(question)
+        record.update(
+            answer=details['answer'],
+            path=details['path'],
+            similarity=round(details['similarity'], 4),
+            qa_id=details['qa_id'],
+            timings_ms={stage: round(ms, 2) for stage, ms in details['timings'].items()},
+        )
+    except Exception as e:
+        record.update(answer=None, path='error', error=str(e))
+    record['wall_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return record
+
+
+def run_batch(chatbot, in_stream, out_stream, workers: int, field: str, id_field: str) -> Dict[str, int]:
+    """Answer all questions from in_stream, writing one JSON line per result"""
+    counts: Dict[str, int] = {}
+    max_pending = max(workers * 2, 1)  # bounded read-ahead keeps memory flat
+
+    def flush(done):
+        for future in done:
+            record = future.result()
+            counts[record['path']] = counts.get(record['path'], 0) + 1
+            out_stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out_stream.flush()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for line_no, item_id, question in iter_questions(in_stream, field, id_field):
+            pending.add(executor.submit(answer_one, chatbot, line_no, item_id, question))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                flush(done)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            flush(done)
+
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Answer questions from a JSONL file in parallel")
+    parser.add_argument("input", help="JSONL file with questions ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file ('-' for stdout)")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel worker threads")
+    parser.add_argument("--max-llm-calls", type=int, default=2, help="Maximum concurrent Groq calls")
+    parser.add_argument("--field", default="question", help="JSON field holding the question")
+    parser.add_argument("--id-field", default="id", help="JSON field copied to the output as 'id'")
+    args = parser.parse_args(argv)
+
+    use_stdout = args.output == "-"
+    out_stream = sys.stdout if use_stdout else open(args.output, "w", encoding="utf-8")
+    in_stream = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+
+    # The pipeline logs progress with print(); keep stdout clean for results
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import OptimizedInternshipChatbot
+
+        chatbot = OptimizedInternshipChatbot(os.environ.get("GROQ_API_KEY"),
+                                             llm_max_concurrency=args.max_llm_calls)
+
+        started = time.perf_counter()
+        try:
+            counts = run_batch(chatbot, in_stream, out_stream, max(args.workers, 1), args.field, args.id_field)
+        finally:
+            if in_stream is not sys.stdin:
+                in_stream.close()
+            if not use_stdout:
+                out_stream.close()
+
+    total = sum(counts.values())
+    elapsed = time.perf_counter() - started
+    summary = ", ".join(f"{path}: {n}" for path, n in sorted(counts.items())) or "no questions"
+    print(f"✅ Answered {total} questions in {elapsed:.2f}s ({summary})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
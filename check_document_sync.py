@@ -0,0 +1,98 @@
+"""Check DocumentSync against a local stand-in HTTP server.
+
+Serves a document from ``http.server`` on localhost with an ETag and walks
+through the revalidation cases: first download (200), unchanged upstream
+(304), a new version with a changed ETag (200, re-extracted), and a second
+worker sharing the same document store, which must revalidate with the
+updated ETag instead of downloading the new version again.
+
+Usage:
+    python check_document_sync.py
+"""
+import contextlib
+import http.server
+import os
+import sys
+import tempfile
+import threading
+from typing import List
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the server's current body and ETag; honours If-None-Match"""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == server.etag:
+            self.send_response(304)
+            self.send_header('ETag', server.etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', server.etag)
+        self.send_header('Content-Length', str(len(server.body)))
+        self.end_headers()
+        self.wfile.write(server.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def extract_text(content: bytes) -> List[str]:
+    """Stand-in for PDF extraction: one page per line"""
+    return content.decode('utf-8').splitlines()
+
+
+def main(argv=None) -> int:
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.body, server.etag, server.requests = "Έκδοση 1\nΣελίδα 2".encode('utf-8'), '"v1"', []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    name = "document.pdf"
+    failures = []
+
+    def check(label: str, condition: bool):
+        print(f"{'✅' if condition else '❌'} {label}")
+        if not condition:
+            failures.append(label)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import DocumentStore, DocumentSync
+
+        directory = tempfile.mkdtemp(prefix="doc_sync_check_")
+        sync = DocumentSync(DocumentStore(directory), base_url, extract_text, interval=0)
+        data_path = sync.doc_store.data_path
+
+    try:
+        sync.ensure(name)
+        check("200: first use downloads and extracts",
+              sync.doc_store.text(name) == "Έκδοση 1\nΣελίδα 2" and sync.doc_store.metadata(name)['etag'] == '"v1"')
+
+        size = os.path.getsize(data_path)
+        check("304: unchanged upstream is not re-downloaded",
+              sync.revalidate(name) == 'not_modified' and os.path.getsize(data_path) == size
+              and server.requests[-1] == '"v1"')
+
+        # A second worker on the same store, still holding the old offset table
+        with contextlib.redirect_stdout(sys.stderr):
+            other = DocumentSync(DocumentStore(directory), base_url, extract_text, interval=0)
+
+        server.body, server.etag = "Έκδοση 2\nΣελίδα 2".encode('utf-8'), '"v2"'
+        check("changed ETag: new version is re-extracted",
+              sync.revalidate(name) == 'updated' and sync.doc_store.text(name) == "Έκδοση 2\nΣελίδα 2"
+              and sync.doc_store.metadata(name)['etag'] == '"v2"')
+
+        size = os.path.getsize(data_path)
+        check("second worker revalidates with the updated ETag",
+              other.revalidate(name) == 'not_modified' and server.requests[-1] == '"v2"'
+              and os.path.getsize(data_path) == size and other.doc_store.text(name) == "Έκδοση 2\nΣελίδα 2")
+    finally:
+        server.shutdown()
+
+    print(f"{4 - len(failures)}/4 checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
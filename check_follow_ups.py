@@ -0,0 +1,64 @@
+"""Check follow-up handling against questions that only look like follow-ups.
+
+Each case asks a priming question and then a short question in the same
+session (shared RetrievalContext). The short question must not be answered
+from the previous turn's candidates when it is really about something else;
+asked on its own, it must still find its own entry.
+
+Usage:
+    python check_follow_ups.py
+"""
+import contextlib
+import sys
+
+HOURS_QUESTION = "πόσες ώρες πρακτικής απαιτούνται συνολικά"
+
+# (priming question or entry id for its exact question, follow-up, id it must not get)
+CASES = [
+    (HOURS_QUESTION, "με ιατρικό πιστοποιητικό;", 4),
+    (HOURS_QUESTION, "το καλοκαίρι;", 4),
+    (2, "με σφραγίδα;", 2),
+]
+
+# (question asked alone, expected entry id)
+STANDALONE = [
+    ("με ιατρικό πιστοποιητικό;", 37),
+]
+
+
+def main(argv=None) -> int:
+    failures = []
+
+    def check(label: str, condition: bool):
+        print(f"{'✅' if condition else '❌'} {label}")
+        if not condition:
+            failures.append(label)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import OptimizedInternshipChatbot, RetrievalContext
+
+        chatbot = OptimizedInternshipChatbot(None)
+
+    for question, expected in STANDALONE:
+        with contextlib.redirect_stdout(sys.stderr):
+            details = chatbot.get_response_details(question, context=RetrievalContext())
+        check(f"'{question}' alone → id {expected} (got {details['qa_id']})", details['qa_id'] == expected)
+
+    for first, question, avoid in CASES:
+        if isinstance(first, int):
+            first = chatbot.qa_by_id[first].question
+        context = RetrievalContext()
+        with contextlib.redirect_stdout(sys.stderr):
+            primed = chatbot.get_response_details(first, context=context)
+            details = chatbot.get_response_details(question, context=context)
+        check(f"'{question}' after '{first}' (id {primed['qa_id']}) is not id {avoid} "
+              f"(got {details['qa_id']}, {details['path']})",
+              primed['qa_id'] == avoid and details['qa_id'] != avoid)
+
+    total = len(STANDALONE) + len(CASES)
+    print(f"{total - len(failures)}/{total} checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
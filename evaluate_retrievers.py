@@ -0,0 +1,109 @@
+"""Side-by-side evaluation of the registered Q&A retrieval engines.
+
+Runs a labelled question set (JSONL lines ``{"question": ..., "relevant": [ids]}``)
+against every engine in ``app.RETRIEVERS`` and reports recall@k, MRR and
+per-query latency, so an engine can be chosen on data.
+
+Usage:
+    python evaluate_retrievers.py --labels eval_questions.jsonl --k 3
+"""
+import argparse
+import contextlib
+import json
+import sys
+import time
+from typing import Dict, List, Tuple
+
+
+def load_labels(path: str) -> List[Tuple[str, set]]:
+    """Read (question, relevant ids) pairs from a JSONL file"""
+    labels = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            relevant = item.get("relevant")
+            if not isinstance(item.get("question"), str) or not relevant:
+                print(f"⚠️ Skipping line {line_no}: needs 'question' and 'relevant'", file=sys.stderr)
+                continue
+            labels.append((item["question"], set(relevant)))
+    return labels
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def evaluate(retriever, labels: List[Tuple[str, set]], k: int) -> Dict[str, float]:
+    """recall@1, recall@k, MRR (over the top k) and latency for one engine"""
+    recall_1 = recall_k = reciprocal_ranks = 0.0
+    latencies = []
+    for question, relevant in labels:
+        started = time.perf_counter()
+        ranked = retriever.retrieve(question, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        ids = [entry.id for score, entry in ranked]
+        recall_1 += len(relevant & set(ids[:1])) / len(relevant)
+        recall_k += len(relevant & set(ids)) / len(relevant)
+        for rank, qa_id in enumerate(ids, start=1):
+            if qa_id in relevant:
+                reciprocal_ranks += 1 / rank
+                break
+
+    n = max(len(labels), 1)
+    return {
+        'recall@1': recall_1 / n,
+        f'recall@{k}': recall_k / n,
+        'mrr': reciprocal_ranks / n,
+        'mean_ms': sum(latencies) / n,
+        'p95_ms': percentile(latencies, 95),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare Q&A retrieval engines on a labelled set")
+    parser.add_argument("--labels", default="eval_questions.jsonl", help="Labelled JSONL question set")
+    parser.add_argument("--k", type=int, default=3, help="Cut-off for recall@k and MRR")
+    parser.add_argument("--engines", help="Comma-separated engines (default: all registered)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import OptimizedInternshipChatbot, RETRIEVERS
+
+        engines = args.engines.split(",") if args.engines else list(RETRIEVERS)
+        unknown = [name for name in engines if name not in RETRIEVERS]
+        if unknown:
+            print(f"❌ Unknown engines: {', '.join(unknown)} (available: {', '.join(RETRIEVERS)})")
+            return 2
+
+        labels = load_labels(args.labels)
+        chatbot = OptimizedInternshipChatbot(None)
+        results = {}
+        for name in engines:
+            retriever = RETRIEVERS[name](chatbot)
+            if labels:
+                retriever.retrieve(labels[0][0], args.k)  # warm-up
+            results[name] = evaluate(retriever, labels, args.k)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"{len(labels)} labelled questions, k={args.k}")
+    columns = list(next(iter(results.values())).keys()) if results else []
+    print(f"{'engine':<12}" + "".join(f"{column:>12}" for column in columns))
+    for name, metrics in results.items():
+        print(f"{name:<12}" + "".join(f"{metrics[column]:>12.3f}" for column in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
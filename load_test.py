@@ -0,0 +1,365 @@
+"""Concurrent-session load test for the Streamlit app.
+
+Drives N simulated student sessions of ``app.py`` through
+``streamlit.testing.v1.AppTest`` with a stubbed Groq client, sending a mix of
+FAQ clicks and free-text questions. For each session count it reports the
+latency per rerun, the memory held per session (from the app's own session
+registry) and the process RSS. Each session count runs in a fresh process so
+the RSS figures do not carry over between levels.
+
+AppTest swaps process-global Streamlit state on every run, so it is not safe
+to run from several threads; sessions are interleaved round-robin in one
+thread. Those figures are per-rerun service times and per-session memory.
+Contention is measured by a second, concurrent phase: N threads share the
+cached chatbot from ``get_chatbot`` and each asks free-text questions through
+``get_response_details`` with its own RetrievalContext and ConversationMemory,
+so the LLM gate's concurrency limit and request coalescing come into play.
+It reports throughput and p50/p95 latency under contention.
+
+Usage:
+    python load_test.py --sessions 1,5,10,20 --turns 8 --groq-delay 0.5
+    python load_test.py --sessions 1 --threads 10,50 --turns 8
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from typing import Dict, List, Optional
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+FREE_TEXT_QUESTIONS = [
+    "Πώς μπορώ να βρω εταιρεία για πρακτική;",
+    "Μπορώ να κάνω πρακτική σε γυμναστήριο το Σάββατο;",
+    "Τι γίνεται αν αρρωστήσω κατά τη διάρκεια της πρακτικής;",
+    "Χρειάζεται ασφάλιση για την πρακτική στο εξωτερικό;",
+    "Ποιος υπογράφει το ημερολόγιο;",
+    "και μετά τι κάνω;",
+]
+
+
+def install_groq_stub(delay: float, answer: str) -> None:
+    """Replace the groq package with a client that sleeps and returns a fixed answer"""
+    class _Completions:
+        def create(self, **kwargs):
+            time.sleep(delay)
+            message = types.SimpleNamespace(content=answer)
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+    class Groq:
+        def __init__(self, api_key=None, **kwargs):
+            self.chat = types.SimpleNamespace(completions=_Completions())
+
+    module = types.ModuleType("groq")
+    module.Groq = Groq
+    sys.modules["groq"] = module
+
+
+def share_script_cache() -> bool:
+    """Compile app.py once for every session, like the server's single ScriptCache.
+
+    AppTest builds a fresh ScriptCache for each rerun, so every rerun would
+    otherwise pay for a compile of app.py that the real server does only once.
+    This patches Streamlit internals; on versions where they differ the test
+    still runs, with the compile included in every rerun.
+    """
+    try:
+        from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+        from streamlit.testing.v1 import app_test, local_script_runner
+    except ImportError as e:
+        print(f"⚠️ Script cache not shared ({e}); reruns include compiling app.py")
+        return False
+    modules = (app_test, local_script_runner)
+    if not all(hasattr(module, "ScriptCache") for module in modules):
+        print("⚠️ Script cache not shared (unknown Streamlit layout); reruns include compiling app.py")
+        return False
+
+    shared = ScriptCache()
+    for module in modules:
+        module.ScriptCache = lambda: shared
+    return True
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def load_questions(path: str) -> List[str]:
+    """Free-text questions: the labelled evaluation set plus a few open-ended ones"""
+    questions = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    questions.append(json.loads(line)["question"])
+    return questions + FREE_TEXT_QUESTIONS
+
+
+def faq_keys(qa_path: str) -> List[str]:
+    with open(qa_path, "r", encoding="utf-8") as f:
+        return [f"faq_{item['id']}" for item in json.load(f)]
+
+
+def run_level(sessions: int, turns: int, faq_ratio: float,
+              questions: List[str], faq_buttons: List[str], seed: int, timeout: float) -> Dict:
+    """Run one session count in this process and collect its measurements"""
+    from streamlit.testing.v1 import AppTest
+
+    script_cache_shared = share_script_cache()
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    def rerun(at, action) -> None:
+        started = time.perf_counter()
+        try:
+            action(at).run()
+            failure = str(at.exception[0].value) if at.exception else None
+        except Exception as e:  # the rerun itself timed out or crashed
+            failure = f"{type(e).__name__}: {e}"
+        latencies.append((time.perf_counter() - started) * 1000)
+        if failure:
+            errors.append(failure)
+
+    # Each session gets its own pre-drawn script so the mix is reproducible
+    scripts = []
+    for _ in range(sessions):
+        script = []
+        for _ in range(turns):
+            if faq_buttons and rng.random() < faq_ratio:
+                key = rng.choice(faq_buttons)
+                script.append(lambda at, key=key: at.sidebar.button(key=key).click())
+            else:
+                question = rng.choice(questions)
+                script.append(lambda at, question=question: at.chat_input[0].set_value(question))
+        scripts.append(script)
+
+    # The first session pays for loading the shared chatbot; measure it apart
+    startup = time.perf_counter()
+    apps = [AppTest.from_file(APP_PATH, default_timeout=timeout)]
+    apps[0].run()
+    startup_ms = (time.perf_counter() - startup) * 1000
+    rss_start = rss_bytes()
+
+    for _ in range(sessions - 1):
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        rerun(at, lambda at: at)
+        apps.append(at)
+
+    # Round-robin: every session takes its next turn before any takes another
+    started = time.perf_counter()
+    for turn in range(turns):
+        for i in range(sessions):
+            rerun(apps[i], scripts[i][turn])
+    wall_s = time.perf_counter() - started
+
+    # Per-session bytes as measured by the app's session registry table (not timed)
+    session_ids = {at.session_state["session_id"][:8] for at in apps if "session_id" in at.session_state}
+    session_bytes = []
+    try:
+        apps[-1].button(key="session_memory").click().run()
+    except Exception as e:
+        print(f"⚠️ Could not open the session memory table: {e}")
+    for table in apps[-1].table:
+        frame = table.value
+        if "session" in frame.columns and "bytes" in frame.columns:
+            session_bytes = [int(row["bytes"]) for _, row in frame.iterrows() if row["session"] in session_ids]
+    rss_end = rss_bytes()
+
+    return {
+        'sessions': sessions,
+        'reruns': len(latencies),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'startup_ms': round(startup_ms, 1),
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p95_ms': round(percentile(latencies, 95), 1),
+        'max_ms': round(max(latencies, default=0.0), 1),
+        'reruns_per_s': round(len(latencies) / wall_s, 2) if wall_s else 0.0,
+        'session_kb_mean': round(sum(session_bytes) / len(session_bytes) / 1024, 1) if session_bytes else None,
+        'session_kb_max': round(max(session_bytes) / 1024, 1) if session_bytes else None,
+        'rss_mb': round(rss_end / 2 ** 20, 1),
+        'rss_kb_per_session': round((rss_end - rss_start) / sessions / 1024, 1),
+        'script_cache_shared': script_cache_shared,
+    }
+
+
+def run_concurrent(threads: int, turns: int, questions: List[str], seed: int) -> Dict:
+    """Ask questions from N threads at once against the shared chatbot"""
+    import app
+
+    chatbot = app.get_chatbot(os.environ.get("GROQ_API_KEY"))
+    gate = chatbot.llm_gate
+    # Fetch the PDFs before timing, as the first visitor of a real deployment would
+    for name in chatbot.pdf_files:
+        try:
+            chatbot.doc_sync.ensure(name)
+        except Exception as e:
+            print(f"⚠️ {name} not cached ({e}); every request will retry the download")
+    rng = random.Random(seed)
+    scripts = [[rng.choice(questions) for _ in range(turns)] for _ in range(threads)]
+    latencies: List[float] = []
+    errors: List[str] = []
+    results_lock = threading.Lock()
+    start = threading.Barrier(threads + 1)
+
+    def session(script: List[str]) -> None:
+        context, memory = app.RetrievalContext(), app.ConversationMemory()
+        start.wait()
+        for question in script:
+            started = time.perf_counter()
+            try:
+                chatbot.get_response_details(question, context, memory)
+                failure = None
+            except Exception as e:
+                failure = f"{type(e).__name__}: {e}"
+            with results_lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+                if failure:
+                    errors.append(failure)
+
+    workers = [threading.Thread(target=session, args=(script,), daemon=True) for script in scripts]
+    for worker in workers:
+        worker.start()
+    calls_before, coalesced_before = gate.stats['calls'], gate.stats['coalesced']
+    start.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    wall_s = time.perf_counter() - started
+
+    return {
+        'threads': threads,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p95_ms': round(percentile(latencies, 95), 1),
+        'max_ms': round(max(latencies, default=0.0), 1),
+        'requests_per_s': round(len(latencies) / wall_s, 2) if wall_s else 0.0,
+        'llm_calls': gate.stats['calls'] - calls_before,
+        'coalesced': gate.stats['coalesced'] - coalesced_before,
+        'llm_limit': gate.max_concurrent,
+        'pdfs_cached': len(chatbot.doc_store),
+    }
+
+
+def level_args(args, sessions: int, phase: str = "--level") -> List[str]:
+    return [sys.executable, os.path.abspath(__file__), phase, str(sessions),
+            "--turns", str(args.turns), "--faq-ratio", str(args.faq_ratio),
+            "--groq-delay", str(args.groq_delay),
+            "--labels", args.labels, "--seed", str(args.seed), "--timeout", str(args.timeout)]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test app.py with simulated concurrent sessions")
+    parser.add_argument("--sessions", default="1,5,10,20", help="Comma-separated session counts")
+    parser.add_argument("--threads", default="1,5,10,20",
+                        help="Comma-separated thread counts for the concurrent phase (empty skips it)")
+    parser.add_argument("--turns", type=int, default=8, help="Reruns per session after the first page load")
+    parser.add_argument("--faq-ratio", type=float, default=0.3, help="Share of turns that click an FAQ button")
+    parser.add_argument("--groq-delay", type=float, default=0.5, help="Seconds the Groq stub takes per call")
+    parser.add_argument("--labels", default="eval_questions.jsonl", help="JSONL file with free-text questions")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the question mix")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds allowed per rerun")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own log output")
+    parser.add_argument("--level", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--concurrent-level", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.level is not None or args.concurrent_level is not None:
+        os.environ.setdefault("GROQ_API_KEY", "load-test")
+        install_groq_stub(args.groq_delay, "Απάντηση δοκιμής φόρτου για την πρακτική άσκηση.")
+        # The app logs with print(); keep stdout for the result line
+        with contextlib.redirect_stdout(sys.stderr):
+            if args.level is not None:
+                result = run_level(args.level, args.turns, args.faq_ratio,
+                                   load_questions(args.labels),
+                                   faq_keys(os.path.join(os.path.dirname(APP_PATH), "qa_data.json")),
+                                   args.seed, args.timeout)
+            else:
+                # Start from an empty answer cache so LLM calls are not all cache hits
+                os.environ.setdefault("SHARED_CACHE_PATH", os.path.join(
+                    tempfile.mkdtemp(prefix="load_test_"), "shared_cache.sqlite3"))
+                result = run_concurrent(args.concurrent_level, args.turns, load_questions(args.labels), args.seed)
+        print(json.dumps(result, ensure_ascii=False))
+        return 0
+
+    def run_phase(phase: str, counts: str, label: str) -> Optional[List[Dict]]:
+        results = []
+        for count in [int(n) for n in counts.split(",") if n.strip()]:
+            print(f"🚀 {count} {label} x {args.turns} turns...", file=sys.stderr)
+            completed = subprocess.run(level_args(args, count, phase), stdout=subprocess.PIPE,
+                                       stderr=None if args.verbose else subprocess.DEVNULL,
+                                       text=True, cwd=os.path.dirname(APP_PATH))
+            if completed.returncode != 0:
+                print(f"❌ {count} {label} failed (exit {completed.returncode}); rerun with --verbose",
+                      file=sys.stderr)
+                return None
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        return results
+
+    results = run_phase("--level", args.sessions, "sessions")
+    concurrent = run_phase("--concurrent-level", args.threads, "threads") if results is not None else None
+    if results is None or concurrent is None:
+        return 1
+
+    if args.json:
+        print(json.dumps({'sessions': results, 'concurrent': concurrent}, indent=2, ensure_ascii=False))
+        return 1 if any(result['errors'] for result in results + concurrent) else 0
+
+    def print_table(columns: List[str], rows: List[Dict]) -> None:
+        widths = [len(column) + 2 for column in columns]
+        print("".join(f"{column:>{width}}" for column, width in zip(columns, widths)))
+        for row in rows:
+            print("".join(f"{str(row[column]):>{width}}" for column, width in zip(columns, widths)))
+
+    if results:
+        print_table(['sessions', 'reruns', 'errors', 'p50_ms', 'p95_ms', 'max_ms', 'reruns_per_s',
+                     'session_kb_mean', 'rss_mb', 'rss_kb_per_session'], results)
+    if concurrent:
+        if results:
+            print()
+        print_table(['threads', 'requests', 'errors', 'p50_ms', 'p95_ms', 'max_ms', 'requests_per_s',
+                     'llm_calls', 'coalesced', 'llm_limit', 'pdfs_cached'], concurrent)
+    failed = 0
+    for result in results:
+        if result['errors']:
+            failed += 1
+            print(f"⚠️ {result['sessions']} sessions: {result['errors']} failed reruns, e.g. {result['first_error']}")
+    for result in concurrent:
+        if result['errors']:
+            failed += 1
+            print(f"⚠️ {result['threads']} threads: {result['errors']} failed requests, e.g. {result['first_error']}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""Offline pre-generation of LLM answers for anticipated questions.
+
+Builds a question set from ``qa_data.json`` (questions, aliases and
+keyword phrasings) and from the chatbot's concept keywords, plus any extra
+questions given as JSONL. Questions the app already answers from the
+knowledge base are skipped; the rest run once through the normal pipeline
+(``get_response_details`` -> ``get_smart_ai_response``) and answers that pass
+vetting are written to the store the app serves before calling Groq.
+
+Answers that pass vetting are written with ``"approved": false``; a reviewer
+sets the flag to true for each answer that may be served. The app serves only
+approved entries, and only while qa_data.json is unchanged. ``--approve``
+skips the review and approves every vetted answer.
+
+Usage:
+    python pregenerate_answers.py -o pregenerated_answers.json --workers 4
+    python pregenerate_answers.py --dry-run            # list LLM-bound questions only
+    python pregenerate_answers.py --approve            # serve vetted answers without review
+    python pregenerate_answers.py --base-url https://api.example.com/openai/v1 --model my-model
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+# Phrasings students use around a single topic word
+KEYWORD_TEMPLATES = [
+    "{}",
+    "τι ισχύει για {};",
+]
+CONCEPT_TEMPLATE = "τι πρέπει να ξέρω για {};"
+
+# Paths on which the live app would call the LLM (with Groq available)
+LLM_PATHS = {'smart_ai', 'medium_match', 'concept_fallback'}
+
+MIN_ANSWER_CHARS = 80
+
+# Answers admitting missing information are left to the live pipeline
+REJECT_PHRASES = ("δεν έχω πληροφορ", "δεν γνωρίζω", "δεν μπορώ να απαντήσω", "δεν είμαι σίγουρ")
+
+
+def generate_questions(chatbot, extra: Optional[List[str]] = None) -> Iterator[str]:
+    """Question set: Q&A phrasings, keyword and concept templates, extras (deduplicated)"""
+    from app import normalize_question
+
+    seen = set()
+
+    def emit(question: str) -> Iterator[str]:
+        key = normalize_question(question)
+        if key and key not in seen:
+            seen.add(key)
+            yield question
+
+    for entry in chatbot.qa_data:
+        for question in (entry.question,) + entry.aliases:
+            yield from emit(question)
+        for keyword in entry.keywords:
+            for template in KEYWORD_TEMPLATES:
+                yield from emit(template.format(keyword))
+    for patterns in chatbot.concept_patterns.values():
+        for keyword in patterns['keywords']:
+            if len(keyword) > 3:
+                yield from emit(CONCEPT_TEMPLATE.format(keyword))
+    for question in extra or []:
+        yield from emit(question)
+
+
+def load_extra(path: str, field: str) -> List[str]:
+    """Extra questions from JSONL (objects with `field`, or plain strings)"""
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                questions.append(item)
+            elif isinstance(item, dict) and isinstance(item.get(field), str):
+                questions.append(item[field])
+    return questions
+
+
+def vet(answer: str) -> Optional[str]:
+    """Reason to reject an answer, or None if it may be served"""
+    if len(answer.strip()) < MIN_ANSWER_CHARS:
+        return "too short"
+    answer_lower = answer.lower()
+    for phrase in REJECT_PHRASES:
+        if phrase in answer_lower:
+            return f"contains '{phrase}'"
+    return None
+
+
+def generate_one(chatbot, question: str, approve: bool = False) -> Dict:
+    details = chatbot.get_response_details(question)
+    record = {'question': question, 'path': details['path']}
+    if details['path'] != 'smart_ai':
+        record['rejected'] = "LLM unavailable or failed"
+        return record
+    reason = vet(details['answer'])
+    if reason:
+        record['rejected'] = reason
+        return record
+    record.update(answer=details['answer'], route=details.get('route'), model=details.get('model'),
+                  similarity=round(details['similarity'], 4), approved=approve)
+    return record
+
+
+def generate_answers(chatbot, questions: List[str], args) -> Optional[List[Dict]]:
+    """Run LLM-bound questions through the live pipeline against the configured backend"""
+    from app import ModelRouter
+
+    api_key = os.environ.get(args.api_key_env)
+    if not api_key:
+        print(f"❌ Set {args.api_key_env} to generate answers")
+        return None
+    try:
+        from groq import Groq
+    except ImportError:
+        print("❌ The groq package is required")
+        return None
+    client_options = {'base_url': args.base_url} if args.base_url else {}
+    chatbot.groq_client = Groq(api_key=api_key, **client_options)
+    if args.model:
+        chatbot.model_router = ModelRouter([{'name': 'pregenerate', 'model': args.model,
+                                             'max_tokens': args.max_tokens}])
+
+    with ThreadPoolExecutor(max_workers=max(args.workers, 1)) as executor:
+        return list(executor.map(lambda question: generate_one(chatbot, question, args.approve), questions))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-generate LLM answers for anticipated questions")
+    parser.add_argument("-o", "--output", default="pregenerated_answers.json", help="Answer store to write")
+    parser.add_argument("--extra", help="JSONL file with additional questions (e.g. from logs)")
+    parser.add_argument("--field", default="question", help="JSON field holding extra questions")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel worker threads")
+    parser.add_argument("--max-llm-calls", type=int, default=2, help="Maximum concurrent LLM calls")
+    parser.add_argument("--base-url", help="OpenAI-compatible endpoint instead of the Groq default")
+    parser.add_argument("--api-key-env", default="GROQ_API_KEY", help="Environment variable with the API key")
+    parser.add_argument("--model", help="Model for every question (default: the app's model routes)")
+    parser.add_argument("--max-tokens", type=int, default=1000, help="Output budget when --model is given")
+    parser.add_argument("--limit", type=int, help="Stop after this many LLM-bound questions")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the questions that would go to the LLM")
+    parser.add_argument("--approve", action="store_true", help="Approve vetted answers without manual review")
+    args = parser.parse_args(argv)
+
+    records = None
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import OptimizedInternshipChatbot, PregeneratedAnswers
+
+        # Never serve from an existing store while regenerating it
+        chatbot = OptimizedInternshipChatbot(None, pregenerated_path=None,
+                                             llm_max_concurrency=args.max_llm_calls)
+        extra = load_extra(args.extra, args.field) if args.extra else []
+        questions = list(generate_questions(chatbot, extra))
+
+        # Keep only questions the knowledge base cannot answer directly (no LLM yet)
+        pending = [question for question in questions
+                   if chatbot.get_response_details(question)['path'] in LLM_PATHS]
+        if args.limit is not None:
+            pending = pending[:args.limit]
+        print(f"📝 {len(questions)} candidate questions, {len(pending)} need the LLM")
+
+        if not args.dry_run:
+            records = generate_answers(chatbot, pending, args)
+
+    if args.dry_run:
+        for question in pending:
+            print(json.dumps({'question': question}, ensure_ascii=False))
+        return 0
+    if records is None:
+        return 2
+
+    accepted = [record for record in records if 'rejected' not in record]
+    store = {
+        'version': PregeneratedAnswers.VERSION,
+        'qa_source_hash': PregeneratedAnswers.source_hash(chatbot._read_qa_source()),
+        'generated': datetime.datetime.now().isoformat(timespec='seconds'),
+        'answers': accepted,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(store, f, ensure_ascii=False, indent=2)
+
+    rejected = [record for record in records if 'rejected' in record]
+    for record in rejected:
+        print(f"⚠️ Rejected '{record['question']}': {record['rejected']}", file=sys.stderr)
+    print(f"✅ Stored {len(accepted)} answers in {args.output} ({len(rejected)} rejected)", file=sys.stderr)
+    if accepted and not args.approve:
+        print("📝 Set \"approved\": true on each reviewed answer; unapproved answers are not served", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
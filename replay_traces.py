@@ -0,0 +1,163 @@
+"""Deterministic offline replay of recorded request traces.
+
+Re-runs every trace in a JSONL file (written by the app with TRACE_PATH set)
+against the current code. The LLM is replaced by the response recorded in the
+trace and, unless --live-passages is given, PDF search returns the recorded
+passages, so only code changes can alter the outcome. The LLM and the
+pregenerated store are enabled per trace as they were when it was recorded;
+pregenerated answers come from the trace unless --pregenerated names a store. Reports path, Q&A id and
+answer changes and compares per-stage latency with the recorded run. Exits 1
+when any outcome changed, with or without --json.
+
+Usage:
+    python replay_traces.py traces.jsonl
+    python replay_traces.py traces.jsonl --changes-only --json > diff.jsonl
+"""
+import argparse
+import contextlib
+import json
+import sys
+import types
+from typing import Dict, List, Optional
+
+
+class RecordedLLM:
+    """Groq client stand-in that answers with the current trace's recorded response"""
+
+    def __init__(self):
+        self.response: Optional[str] = None
+        self.calls = 0
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls += 1
+        message = types.SimpleNamespace(content=self.response or "")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+class RecordedPregenerated:
+    """Pregenerated store stand-in that serves the current trace's answer if it was pregenerated"""
+
+    def __init__(self):
+        self.answer: Optional[str] = None
+
+    def lookup(self, question: str, rewritten: Optional[str] = None) -> Optional[Dict]:
+        return {'answer': self.answer} if self.answer is not None else None
+
+
+def load_traces(path: str, limit: Optional[int] = None) -> List[Dict]:
+    traces = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                traces.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                print(f"⚠️ Skipping line {line_no}: invalid JSON ({e})", file=sys.stderr)
+            if limit is not None and len(traces) >= limit:
+                break
+    return traces
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def replay_one(chatbot, llm: RecordedLLM, trace: Dict, live_passages: bool,
+               pregenerated=None) -> Dict:
+    """Re-run one trace and compare it with the recorded outcome"""
+    from app import RetrievalContext
+
+    llm.response = trace.get('llm_response')
+    chatbot.groq_client = llm if trace.get('llm_enabled', True) else None
+    if pregenerated is None:
+        recorded = RecordedPregenerated()
+        if trace.get('path') == 'pregenerated':
+            recorded.answer = trace['answer']
+        pregenerated = recorded if trace.get('pregenerated_enabled', trace.get('path') == 'pregenerated') else None
+    chatbot.pregenerated = pregenerated
+    if not live_passages:
+        chatbot.search_pdfs_intelligently = lambda question, concepts: trace.get('passages') or ""
+
+    context = None
+    if trace.get('context'):
+        previous = trace['context']
+        context = RetrievalContext()
+        context.update(previous['question'], previous['qa_ids'], previous.get('passages'))
+
+    calls_before = llm.calls
+    details = chatbot.get_response_details(trace['question'], context)
+    result = {
+        'question': trace['question'],
+        'path': [trace['path'], details['path']],
+        'qa_id': [trace['qa_id'], details['qa_id']],
+        'answer_changed': details['answer'] != trace['answer'],
+        'timings': {stage: [trace['timings'].get(stage), round(ms, 3)]
+                    for stage, ms in details['timings'].items()},
+    }
+    if llm.calls > calls_before and trace.get('llm_response') is None:
+        result['llm_missing'] = True  # the current code calls the LLM where the recorded run did not
+    result['changed'] = (result['path'][0] != result['path'][1] or result['qa_id'][0] != result['qa_id'][1]
+                         or result['answer_changed'])
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded request traces against the current code")
+    parser.add_argument("traces", help="JSONL trace file (TRACE_PATH)")
+    parser.add_argument("--limit", type=int, help="Replay only the first N traces")
+    parser.add_argument("--retriever", default="heuristic", help="Retrieval engine to replay with")
+    parser.add_argument("--pregenerated", default="",
+                        help="Pregenerated answer store to serve for every trace (default: recorded answers)")
+    parser.add_argument("--live-passages", action="store_true", help="Search the PDFs instead of using recorded passages")
+    parser.add_argument("--changes-only", action="store_true", help="Only output traces whose outcome changed")
+    parser.add_argument("--json", action="store_true", help="Print one JSON result per trace")
+    args = parser.parse_args(argv)
+
+    traces = load_traces(args.traces, args.limit)
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import OptimizedInternshipChatbot
+
+        chatbot = OptimizedInternshipChatbot(None, retriever=args.retriever,
+                                             pregenerated_path=args.pregenerated or None)
+        llm = RecordedLLM()
+        store = chatbot.pregenerated if args.pregenerated else None
+        results = [replay_one(chatbot, llm, trace, args.live_passages, store) for trace in traces]
+
+    changed = [result for result in results if result['changed']]
+    shown = changed if args.changes_only else results
+    if args.json:
+        for result in shown:
+            print(json.dumps(result, ensure_ascii=False))
+        return 1 if changed else 0
+
+    for result in shown:
+        if result['changed']:
+            print(f"≠ {result['question'][:60]!r}: path {result['path'][0]} → {result['path'][1]}, "
+                  f"qa_id {result['qa_id'][0]} → {result['qa_id'][1]}"
+                  + (", answer changed" if result['answer_changed'] else ""))
+    print(f"{len(results)} traces replayed, {len(changed)} changed, "
+          f"{sum(1 for result in results if result.get('llm_missing'))} without a recorded LLM response")
+
+    stages = sorted({stage for result in results for stage in result['timings']})
+    print(f"{'stage':<12}{'recorded_ms':>14}{'replay_ms':>14}{'rec_p95':>12}{'replay_p95':>12}")
+    for stage in stages:
+        pairs = [result['timings'][stage] for result in results
+                 if stage in result['timings'] and result['timings'][stage][0] is not None]
+        if not pairs:
+            continue
+        recorded = [pair[0] for pair in pairs]
+        replayed = [pair[1] for pair in pairs]
+        print(f"{stage:<12}{sum(recorded) / len(recorded):>14.2f}{sum(replayed) / len(replayed):>14.2f}"
+              f"{percentile(recorded, 95):>12.2f}{percentile(replayed, 95):>12.2f}")
+    return 1 if changed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())